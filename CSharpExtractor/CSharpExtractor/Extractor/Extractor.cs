@@ -21,6 +21,7 @@ namespace Extractor
             SyntaxKind.ElementAccessExpression, SyntaxKind.SimpleMemberAccessExpression, SyntaxKind.InvocationExpression, SyntaxKind.BracketedArgumentList, SyntaxKind.ArgumentList};
 
         private ICollection<Variable> variables;
+        private Tree methodTree;
 
         public int LengthLimit { get; set; }
         public int WidthLimit { get; set; }
@@ -86,8 +87,7 @@ namespace Extractor
 
         private int GetTruncatedChildId(SyntaxNode n)
         {
-            var parent = n.Parent;
-            int index = parent.ChildNodes().ToList().IndexOf(n);
+            int index = methodTree.GetChildIndex(n);
             if (index > 3)
             {
                 index = 3;
@@ -177,6 +177,7 @@ namespace Extractor
                 var subtokensMethodName = Utilities.SplitToSubtokens(methodName);
                 var tokenToVar = new Dictionary<SyntaxToken, Variable>();
                 this.variables = Variable.CreateFromMethod(methodTree).ToArray();
+                this.methodTree = methodTree;
 
                 foreach (var variable in variables)
                 {
@@ -43,31 +43,28 @@ namespace Extractor
 			this.tree = tree;
 		}
 
-		private int GetDepth(SyntaxNode n)
+		public SyntaxNode FirstAncestor(SyntaxNode l, SyntaxNode r)
 		{
-            int depth = 0;
-			while(n.Parent != null)
-            {
-                n = n.Parent;
-                depth++;
-            }
-            return depth;
+			return FirstAncestor(l, tree.GetDepth(l), r, tree.GetDepth(r));
 		}
 
-		public SyntaxNode FirstAncestor(SyntaxNode l, SyntaxNode r)
+		// Brings the deeper node up to the depth of the other, then moves both up until they meet
+		private SyntaxNode FirstAncestor(SyntaxNode l, int lDepth, SyntaxNode r, int rDepth)
 		{
-			if (l.Equals(r))
-				return l;
-
-			if (GetDepth(l) >= GetDepth(r))
+			for (; lDepth > rDepth; lDepth--)
 			{
 				l = l.Parent;
 			}
-			else
+			for (; rDepth > lDepth; rDepth--)
 			{
 				r = r.Parent;
 			}
-			return FirstAncestor(l, r);
+			while (!l.Equals(r))
+			{
+				l = l.Parent;
+				r = r.Parent;
+			}
+			return l;
 		}
 
 		private IEnumerable<SyntaxNode> CollectPathToParent(SyntaxNode start, SyntaxNode parent)
@@ -81,24 +78,25 @@ namespace Extractor
 
 		internal Path FindPath(SyntaxToken l, SyntaxToken r, bool limited = true)
 		{
-			SyntaxNode p = FirstAncestor(l.Parent, r.Parent);
+			int lDepth = tree.GetDepth(l.Parent);
+			int rDepth = tree.GetDepth(r.Parent);
+			SyntaxNode p = FirstAncestor(l.Parent, lDepth, r.Parent, rDepth);
 
 			// + 2 for the distance of the leafs themselves
-			if (GetDepth(r.Parent) + GetDepth(l.Parent) - 2 * GetDepth(p) + 2 > Length)
+			if (rDepth + lDepth - 2 * tree.GetDepth(p) + 2 > Length)
 			{
 				return null;
 			}
 
-			var leftSide = CollectPathToParent(l.Parent, p);
-			var rightSide = CollectPathToParent(r.Parent, p);
-			rightSide = rightSide.Reverse();
+			var leftSide = CollectPathToParent(l.Parent, p).ToList();
+			var rightSide = CollectPathToParent(r.Parent, p).ToList();
+			rightSide.Reverse();
 
-			List<SyntaxNode> widthCheck = p.ChildNodes().ToList();
-			if (limited && leftSide.Count() != 0
-			    && rightSide.Count() != 0)
+			if (limited && leftSide.Count != 0
+			    && rightSide.Count != 0)
 			{
-				int indexOfLeft = widthCheck.IndexOf(leftSide.Last());
-				int indexOfRight = widthCheck.IndexOf(rightSide.First());
+				int indexOfLeft = tree.GetChildIndex(leftSide.Last());
+				int indexOfRight = tree.GetChildIndex(rightSide.First());
 				if (Math.Abs(indexOfLeft - indexOfRight) >= Width)
 				{
 					return null;
@@ -18,6 +18,31 @@ namespace Extractor
             return result;
         }
 
+        // Runs as a long-lived worker of extract.py: for every file path read from stdin, writes the lines extracted
+        // from the file to stdout, followed by an empty line (also when the extraction failed), so that the driver
+        // knows where the output of every file ends
+        static void ExtractFromStdin(Options options)
+        {
+            var stdout = new StreamWriter(Console.OpenStandardOutput());
+            string filename;
+            while ((filename = Console.In.ReadLine()) != null)
+            {
+                try
+                {
+                    foreach (var res in ExtractSingleFile(filename, options))
+                    {
+                        stdout.WriteLine(res);
+                    }
+                }
+                catch (Exception e)
+                {
+                    Console.Error.WriteLine("Failed to extract " + filename + ": " + e.Message);
+                }
+                stdout.WriteLine();
+                stdout.Flush();
+            }
+        }
+
         static void Main(string[] args)
         {
             Options options = new Options();
@@ -29,6 +54,12 @@ namespace Extractor
                     return;
                 });
 
+            if (options.Stdin)
+            {
+                ExtractFromStdin(options);
+                return;
+            }
+
             string path = options.Path;
             string[] files;
             if (Directory.Exists(path))
@@ -96,6 +96,10 @@ namespace Extractor
         SyntaxNode tree;
         internal Dictionary<SyntaxNode, Node> nodes = new Dictionary<SyntaxNode, Node>();
         internal Dictionary<SyntaxToken, Leaf> leaves = new Dictionary<SyntaxToken, Leaf>();
+        // the depth (from the root of the syntax tree) and the index among the child nodes of its parent of every node,
+        // computed once per tree instead of walking to the root or listing the siblings for every path
+        Dictionary<SyntaxNode, int> depths = new Dictionary<SyntaxNode, int>();
+        Dictionary<SyntaxNode, int> childIndices = new Dictionary<SyntaxNode, int>();
 
         public Tree(SyntaxNode syntaxTree)
         {
@@ -107,10 +111,48 @@ namespace Extractor
             }*/
             new TreeBuilderWalker(nodes, leaves).Visit(this.tree);
 
+            depths[tree] = ComputeDepth(tree);
+            foreach (SyntaxNode node in tree.DescendantNodesAndSelf())
+            {
+                int childIndex = 0;
+                foreach (SyntaxNode child in node.ChildNodes())
+                {
+                    depths[child] = depths[node] + 1;
+                    childIndices[child] = childIndex++;
+                }
+            }
+
             List<SyntaxTrivia> commentNodes = tree.DescendantTrivia().Where(
                 node => node.IsKind(SyntaxKind.MultiLineCommentTrivia) || node.IsKind(SyntaxKind.SingleLineCommentTrivia)).ToList();
 
         }
+
+        private static int ComputeDepth(SyntaxNode n)
+        {
+            int depth = 0;
+            while (n.Parent != null)
+            {
+                n = n.Parent;
+                depth++;
+            }
+            return depth;
+        }
+
+        internal int GetDepth(SyntaxNode n)
+        {
+            int depth;
+            return depths.TryGetValue(n, out depth) ? depth : ComputeDepth(n);
+        }
+
+        internal int GetChildIndex(SyntaxNode n)
+        {
+            int childIndex;
+            if (childIndices.TryGetValue(n, out childIndex))
+            {
+                return childIndex;
+            }
+            return n.Parent.ChildNodes().ToList().IndexOf(n);
+        }
     }
 
     public class Node
@@ -30,6 +30,9 @@ namespace Extractor
 
         [Option('l', "max_contexts", Default = 30000, HelpText = "Max number of path contexts to sample. Affects only very large snippets")]
         public int MaxContexts { get; set; }
+
+        [Option("stdin", Default = false, HelpText = "Read file paths from stdin, one per line, and write the contexts of every file to stdout, followed by an empty line")]
+        public bool Stdin { get; set; }
     }
 
     public static class Utilities
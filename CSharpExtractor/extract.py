@@ -1,76 +1,139 @@
 #!/usr/bin/python
 
-import itertools
-import multiprocessing
 import os
-import sys
-import shutil
+import queue
 import subprocess
-from threading import Timer
 import sys
+import threading
 from argparse import ArgumentParser
-from subprocess import Popen, PIPE, STDOUT, call
-
-
-
-def get_immediate_subdirectories(a_dir):
-    return [(os.path.join(a_dir, name)) for name in os.listdir(a_dir)
-            if os.path.isdir(os.path.join(a_dir, name))]
-
-
-TMP_DIR = ""
-
-def ParallelExtractDir(args, dir):
-    ExtractFeaturesForDir(args, dir, "")
-
-
-def ExtractFeaturesForDir(args, dir, prefix):
-    command = ['dotnet', 'run', '--project', args.csproj,
-               '--max_length', str(args.max_path_length), '--max_width', str(args.max_path_width),
-               '--path', dir, '--threads', str(args.num_threads), '--ofile_name', str(args.ofile_name)]
-
-
-    # print command
-    # os.system(command)
-    kill = lambda process: process.kill()
-    sleeper = subprocess.Popen(command, stderr=subprocess.PIPE)
-    timer = Timer(600000, kill, [sleeper])
+from threading import Timer
 
-    try:
+'''
+Extracts the paths of all the .cs files in a directory (recursively) into --ofile_name.
+The extractor is built once (or given with --extractor_dll), and runs as --num_threads long-lived worker processes
+that get the paths of the files to extract over stdin. A file that is not extracted within --timeout seconds is
+skipped, and its worker is restarted. The output of the files is appended to --ofile_name in the (sorted) order of
+the files, only by this process. The workers run at most PENDING_FILES_PER_THREAD * --num_threads files ahead of the
+next file to write, so the outputs that wait for a slow file to be written before them take bounded memory.
+'''
+
+PENDING_FILES_PER_THREAD = 4
+
+
+def get_files(path):
+    if os.path.isfile(path):
+        return [path]
+    files = []
+    for dirpath, dirnames, filenames in os.walk(path):
+        dirnames.sort()
+        files.extend(os.path.join(dirpath, name) for name in sorted(filenames) if name.endswith('.cs'))
+    return files
+
+
+def BuildExtractor(args):
+    output_dir = os.path.join(os.path.dirname(os.path.abspath(args.csproj)), 'bin', 'extract')
+    subprocess.check_call(['dotnet', 'build', args.csproj, '--configuration', 'Release', '--output', output_dir],
+                          stdout=sys.stderr)
+    return os.path.join(output_dir, os.path.splitext(os.path.basename(args.csproj))[0] + '.dll')
+
+
+class ExtractorWorker:
+    def __init__(self, args, extractor_dll):
+        self.command = ['dotnet', extractor_dll, '--stdin',
+                        '--max_length', str(args.max_path_length), '--max_width', str(args.max_path_width)]
+        self.timeout = args.timeout
+        self.process = None
+        self.start()
+
+    def start(self):
+        self.process = subprocess.Popen(self.command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                        universal_newlines=True, encoding='utf-8')
+
+    def stop(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+    def extract(self, path):
+        # Returns the lines extracted from the file, or None if the extraction did not complete in time
+        if self.process.poll() is not None:
+            # killed by the timer of the previous file after it was completed
+            self.start()
+        timer = Timer(self.timeout, self.process.kill)
         timer.start()
-        _, stderr = sleeper.communicate()
-    finally:
-        timer.cancel()
-
-    if sleeper.poll() == 0:
-        if len(stderr) > 0:
-            print(sys.stderr, stderr)
-    else:
-        print(sys.stderr, 'dir: ' + str(dir) + ' was not completed in time')
-        failed = True
-        subdirs = get_immediate_subdirectories(dir)
-        for subdir in subdirs:
-            ExtractFeaturesForDir(args, subdir, prefix + dir.split('/')[-1] + '_')
-    if failed:
-        if os.path.exists(str(args.ofile_name)):
-            os.remove(str(args.ofile_name))
-
-def ExtractFeaturesForDirsList(args, dirs):
-    global TMP_DIR
-    TMP_DIR = "./tmp/feature_extractor%d/" % (os.getpid())
-    if os.path.exists(TMP_DIR):
-        shutil.rmtree(TMP_DIR, ignore_errors=True)
-    os.makedirs(TMP_DIR)
+        lines = []
+        try:
+            self.process.stdin.write(path + '\n')
+            self.process.stdin.flush()
+            while True:
+                line = self.process.stdout.readline()
+                if line == '\n':
+                    return lines
+                if line == '':
+                    # the process was killed by the timer, or crashed
+                    break
+                lines.append(line)
+        except (BrokenPipeError, OSError):
+            pass
+        finally:
+            timer.cancel()
+
+        print('file: ' + str(path) + ' was not completed in time, or the extractor failed', file=sys.stderr)
+        self.process.kill()
+        self.process.wait()
+        self.start()
+        return None
+
+
+class OrderedWriter:
+    # Writes the outputs of the files in the order of their indices, as soon as all the previous ones are written.
+    # Only the files of the max_pending indices from the next one to write are extracted (see wait_for_turn)
+    def __init__(self, output_file, max_pending):
+        self.output_file = output_file
+        self.max_pending = max_pending
+        self.pending = {}
+        self.next_index = 0
+        self.condition = threading.Condition()
+
+    def wait_for_turn(self, index):
+        # Blocks until the file of index is among the max_pending next files to write. The files are taken in the
+        # order of their indices, so the next file to write is always being extracted, and never waits
+        with self.condition:
+            self.condition.wait_for(lambda: index < self.next_index + self.max_pending)
+
+    def add(self, index, lines):
+        with self.condition:
+            self.pending[index] = lines
+            while self.next_index in self.pending:
+                self.output_file.writelines(self.pending.pop(self.next_index) or [])
+                self.next_index += 1
+            self.condition.notify_all()
+
+
+def RunWorker(worker, files_queue, writer):
     try:
-        p = multiprocessing.Pool(4)
-        p.starmap(ParallelExtractDir, zip(itertools.repeat(args), dirs))
-        #for dir in dirs:
-        #    ExtractFeaturesForDir(args, dir, '')
-        output_files = os.listdir(TMP_DIR)
-        for f in output_files:
-            os.system("cat %s/%s" % (TMP_DIR, f))
+        while True:
+            try:
+                index, path = files_queue.get_nowait()
+            except queue.Empty:
+                return
+            writer.wait_for_turn(index)
+            writer.add(index, worker.extract(path))
     finally:
-        shutil.rmtree(TMP_DIR, ignore_errors=True)
+        worker.stop()
+
+
+def ExtractFeaturesForFiles(args, files, extractor_dll):
+    files_queue = queue.Queue()
+    for index, path in enumerate(files):
+        files_queue.put((index, path))
+    with open(args.ofile_name, 'a', encoding='utf-8') as output_file:
+        writer = OrderedWriter(output_file, max_pending=PENDING_FILES_PER_THREAD * args.num_threads)
+        threads = [threading.Thread(target=RunWorker, args=(ExtractorWorker(args, extractor_dll), files_queue, writer))
+                   for _ in range(min(args.num_threads, len(files)))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
 
 
 if __name__ == '__main__':
@@ -78,15 +141,19 @@ if __name__ == '__main__':
     parser = ArgumentParser()
     parser.add_argument("-maxlen", "--max_path_length", dest="max_path_length", required=False, default=8)
     parser.add_argument("-maxwidth", "--max_path_width", dest="max_path_width", required=False, default=2)
-    parser.add_argument("-threads", "--num_threads", dest="num_threads", required=False, default=64)
-    parser.add_argument("--csproj", dest="csproj", required=True)
+    parser.add_argument("-threads", "--num_threads", dest="num_threads", type=int, required=False, default=64,
+                        help="the number of extractor processes")
+    parser.add_argument("--csproj", dest="csproj", required=False)
+    parser.add_argument("--extractor_dll", dest="extractor_dll", required=False,
+                        help="a prebuilt extractor, instead of building --csproj")
     parser.add_argument("-dir", "--dir", dest="dir", required=False)
     parser.add_argument("-ofile_name", "--ofile_name", dest="ofile_name", required=True)
+    parser.add_argument("--timeout", dest="timeout", type=int, required=False, default=600,
+                        help="the max number of seconds to extract a single file")
     args = parser.parse_args()
+    if args.csproj is None and args.extractor_dll is None:
+        parser.error('one of --csproj and --extractor_dll is required')
 
     if args.dir is not None:
-        subdirs = get_immediate_subdirectories(args.dir)
-        to_extract = subdirs
-        if len(subdirs) == 0:
-            to_extract = [args.dir.rstrip('/')]
-        ExtractFeaturesForDirsList(args, to_extract)
+        extractor_dll = args.extractor_dll or BuildExtractor(args)
+        ExtractFeaturesForFiles(args, get_files(args.dir.rstrip('/')), extractor_dll)
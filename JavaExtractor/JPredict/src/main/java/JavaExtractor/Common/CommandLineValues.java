@@ -43,6 +43,13 @@ public class CommandLineValues {
     @Option(name = "--json_output", required = false)
     public boolean JsonOutput = false;
 
+    @Option(name = "--max_contexts", required = false,
+            usage = "Uniformly sample at most this number of contexts per method (0 - all the contexts)")
+    public int MaxContexts = 0;
+
+    @Option(name = "--seed", required = false, usage = "The seed of the sampling of --max_contexts")
+    public long Seed = 239;
+
     public CommandLineValues(String... args) throws CmdLineException {
         CmdLineParser parser = new CmdLineParser(this);
         try {
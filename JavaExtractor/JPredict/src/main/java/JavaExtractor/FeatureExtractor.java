@@ -14,19 +14,11 @@ import com.github.javaparser.ast.Node;
 import java.io.File;
 import java.nio.file.Path;
 import java.util.ArrayList;
-import java.util.HashSet;
-import java.util.Set;
-import java.util.StringJoiner;
-import java.util.stream.Collectors;
-import java.util.stream.Stream;
+import java.util.Comparator;
+import java.util.Random;
 
 @SuppressWarnings("StringEquality")
 class FeatureExtractor {
-    private final static String upSymbol = "|";
-    private final static String downSymbol = "|";
-    private static final Set<String> s_ParentTypeToAddChildId = Stream
-            .of("AssignExpr", "ArrayAccessExpr", "FieldAccessExpr", "MethodCallExpr")
-            .collect(Collectors.toCollection(HashSet::new));
     private final CommandLineValues m_CommandLineValues;
     private final Path filePath;
 
@@ -35,25 +27,17 @@ class FeatureExtractor {
         this.filePath = filePath;
     }
 
-    private static ArrayList<Node> getTreeStack(Node node) {
-        ArrayList<Node> upStack = new ArrayList<>();
-        Node current = node;
-        while (current != null) {
-            upStack.add(current);
-            current = current.getParentNode();
-        }
-        return upStack;
+    public ArrayList<ProgramFeatures> extractFeatures(String code) {
+        return generatePathFeatures(extractMethods(code));
     }
 
-    public ArrayList<ProgramFeatures> extractFeatures(String code) {
+    ArrayList<MethodContent> extractMethods(String code) {
         CompilationUnit m_CompilationUnit = parseFileWithRetries(code);
         FunctionVisitor functionVisitor = new FunctionVisitor(m_CommandLineValues);
 
         functionVisitor.visit(m_CompilationUnit, null);
 
-        ArrayList<MethodContent> methods = functionVisitor.getMethodContents();
-
-        return generatePathFeatures(methods);
+        return functionVisitor.getMethodContents();
     }
 
     private CompilationUnit parseFileWithRetries(String code) {
@@ -96,12 +80,20 @@ class FeatureExtractor {
         ArrayList<Node> functionLeaves = methodContent.getLeaves();
         ProgramFeatures programFeatures = new ProgramFeatures(
                 methodContent.getName(), this.filePath, methodContent.getContent());
+        PathGenerator pathGenerator = new PathGenerator(m_CommandLineValues, functionLeaves);
+
+        if (m_CommandLineValues.MaxContexts > 0) {
+            for (int[] pair : sampleValidLeafPairs(functionLeaves, pathGenerator)) {
+                programFeatures.addFeature(functionLeaves.get(pair[0]).getUserData(Common.PropertyKey),
+                        pathGenerator.generatePath(pair[0], pair[1], pair[2]),
+                        functionLeaves.get(pair[1]).getUserData(Common.PropertyKey));
+            }
+            return programFeatures;
+        }
 
         for (int i = 0; i < functionLeaves.size(); i++) {
             for (int j = i + 1; j < functionLeaves.size(); j++) {
-                String separator = Common.EmptyString;
-
-                String path = generatePath(functionLeaves.get(i), functionLeaves.get(j), separator);
+                String path = pathGenerator.generatePath(i, j);
                 if (path != Common.EmptyString) {
                     Property source = functionLeaves.get(i).getUserData(Common.PropertyKey);
                     Property target = functionLeaves.get(j).getUserData(Common.PropertyKey);
@@ -112,76 +104,32 @@ class FeatureExtractor {
         return programFeatures;
     }
 
-    private String generatePath(Node source, Node target, String separator) {
-
-        StringJoiner stringBuilder = new StringJoiner(separator);
-        ArrayList<Node> sourceStack = getTreeStack(source);
-        ArrayList<Node> targetStack = getTreeStack(target);
-
-        int commonPrefix = 0;
-        int currentSourceAncestorIndex = sourceStack.size() - 1;
-        int currentTargetAncestorIndex = targetStack.size() - 1;
-        while (currentSourceAncestorIndex >= 0 && currentTargetAncestorIndex >= 0
-                && sourceStack.get(currentSourceAncestorIndex) == targetStack.get(currentTargetAncestorIndex)) {
-            commonPrefix++;
-            currentSourceAncestorIndex--;
-            currentTargetAncestorIndex--;
-        }
-
-        int pathLength = sourceStack.size() + targetStack.size() - 2 * commonPrefix;
-        if (pathLength > m_CommandLineValues.MaxPathLength) {
-            return Common.EmptyString;
-        }
-
-        if (currentSourceAncestorIndex >= 0 && currentTargetAncestorIndex >= 0) {
-            int pathWidth = targetStack.get(currentTargetAncestorIndex).getUserData(Common.ChildId)
-                    - sourceStack.get(currentSourceAncestorIndex).getUserData(Common.ChildId);
-            if (pathWidth > m_CommandLineValues.MaxPathWidth) {
-                return Common.EmptyString;
-            }
-        }
-
-        for (int i = 0; i < sourceStack.size() - commonPrefix; i++) {
-            Node currentNode = sourceStack.get(i);
-            String childId = Common.EmptyString;
-            String parentRawType = currentNode.getParentNode().getUserData(Common.PropertyKey).getRawType();
-            if (i == 0 || s_ParentTypeToAddChildId.contains(parentRawType)) {
-                childId = saturateChildId(currentNode.getUserData(Common.ChildId))
-                        .toString();
-            }
-            stringBuilder.add(String.format("%s%s%s",
-                    currentNode.getUserData(Common.PropertyKey).getType(true), childId, upSymbol));
-        }
-
-        Node commonNode = sourceStack.get(sourceStack.size() - commonPrefix);
-        String commonNodeChildId = Common.EmptyString;
-        Property parentNodeProperty = commonNode.getParentNode().getUserData(Common.PropertyKey);
-        String commonNodeParentRawType = Common.EmptyString;
-        if (parentNodeProperty != null) {
-            commonNodeParentRawType = parentNodeProperty.getRawType();
-        }
-        if (s_ParentTypeToAddChildId.contains(commonNodeParentRawType)) {
-            commonNodeChildId = saturateChildId(commonNode.getUserData(Common.ChildId))
-                    .toString();
-        }
-        stringBuilder.add(String.format("%s%s",
-                commonNode.getUserData(Common.PropertyKey).getType(true), commonNodeChildId));
-
-        for (int i = targetStack.size() - commonPrefix - 1; i >= 0; i--) {
-            Node currentNode = targetStack.get(i);
-            String childId = Common.EmptyString;
-            if (i == 0 || s_ParentTypeToAddChildId.contains(currentNode.getUserData(Common.PropertyKey).getRawType())) {
-                childId = saturateChildId(currentNode.getUserData(Common.ChildId))
-                        .toString();
+    // Uniformly samples MaxContexts of the pairs of leaves that have a valid path, using reservoir sampling (like the
+    // C# extractor), so that the path strings are generated only for the sampled pairs. The sample is seeded, and its
+    // pairs (source, target, common prefix) are returned in the order in which they are generated without sampling.
+    private ArrayList<int[]> sampleValidLeafPairs(ArrayList<Node> leaves, PathGenerator pathGenerator) {
+        Random random = new Random(m_CommandLineValues.Seed);
+        int maxContexts = m_CommandLineValues.MaxContexts;
+        ArrayList<int[]> sampledPairs = new ArrayList<>(maxContexts);
+        long seenPairs = 0;
+        for (int i = 0; i < leaves.size(); i++) {
+            for (int j = i + 1; j < leaves.size(); j++) {
+                int commonPrefix = pathGenerator.getCommonPrefix(i, j);
+                if (commonPrefix < 0) {
+                    continue;
+                }
+                seenPairs++;
+                if (sampledPairs.size() < maxContexts) {
+                    sampledPairs.add(new int[]{i, j, commonPrefix});
+                } else {
+                    long position = (long) (random.nextDouble() * seenPairs);
+                    if (position < maxContexts) {
+                        sampledPairs.set((int) position, new int[]{i, j, commonPrefix});
+                    }
+                }
             }
-            stringBuilder.add(String.format("%s%s%s", downSymbol,
-                    currentNode.getUserData(Common.PropertyKey).getType(true), childId));
         }
-
-        return stringBuilder.toString();
-    }
-
-    private Integer saturateChildId(int childId) {
-        return Math.min(childId, m_CommandLineValues.MaxChildId);
+        sampledPairs.sort(Comparator.<int[]>comparingInt(pair -> pair[0]).thenComparingInt(pair -> pair[1]));
+        return sampledPairs;
     }
 }
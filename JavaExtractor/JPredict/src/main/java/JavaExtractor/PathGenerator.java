@@ -0,0 +1,188 @@
+package JavaExtractor;
+
+import JavaExtractor.Common.CommandLineValues;
+import JavaExtractor.Common.Common;
+import JavaExtractor.FeaturesEntities.Property;
+import com.github.javaparser.ast.Node;
+
+import java.util.ArrayList;
+import java.util.HashSet;
+import java.util.IdentityHashMap;
+import java.util.Set;
+import java.util.stream.Collectors;
+import java.util.stream.Stream;
+
+/**
+ * Generates the paths between the leaves of a single method.
+ * The ancestors of every leaf are collected once (instead of once per pair of leaves), and the string of every node
+ * in a path is rendered once. The common prefix of a pair of leaves (the depth of their lowest common ancestor) is
+ * found by comparing their ancestors at the same depth, starting from the deepest one, and giving up when the path
+ * would be longer than the max path length.
+ */
+class PathGenerator {
+    private final static String upSymbol = "|";
+    private final static String downSymbol = "|";
+    private static final Set<String> s_ParentTypeToAddChildId = Stream
+            .of("AssignExpr", "ArrayAccessExpr", "FieldAccessExpr", "MethodCallExpr")
+            .collect(Collectors.toCollection(HashSet::new));
+    private final CommandLineValues m_CommandLineValues;
+    private final ArrayList<Node> nodes = new ArrayList<>();
+    // ancestors[i][k] is the index (in nodes) of the k-th ancestor of leaf i: the leaf itself is at k = 0, and the
+    // root at k = ancestors[i].length - 1, so the ancestor at depth d (the root is at depth 1) is at length - d.
+    private final int[][] ancestors;
+    private final String[] upStrings;
+    private final String[] downStrings;
+    private final String[] commonStrings;
+    private final String[] leafUpStrings;
+    private final String[] leafDownStrings;
+    private final StringBuilder pathBuilder = new StringBuilder();
+
+    public PathGenerator(CommandLineValues commandLineValues, ArrayList<Node> leaves) {
+        this.m_CommandLineValues = commandLineValues;
+        IdentityHashMap<Node, Integer> nodeIndices = new IdentityHashMap<>();
+        ancestors = new int[leaves.size()][];
+        ArrayList<Integer> stack = new ArrayList<>();
+        for (int i = 0; i < leaves.size(); i++) {
+            stack.clear();
+            for (Node current = leaves.get(i); current != null; current = current.getParentNode()) {
+                Integer index = nodeIndices.get(current);
+                if (index == null) {
+                    index = nodes.size();
+                    nodeIndices.put(current, index);
+                    nodes.add(current);
+                }
+                stack.add(index);
+            }
+            ancestors[i] = stack.stream().mapToInt(Integer::intValue).toArray();
+        }
+        upStrings = new String[nodes.size()];
+        downStrings = new String[nodes.size()];
+        commonStrings = new String[nodes.size()];
+        leafUpStrings = new String[leaves.size()];
+        leafDownStrings = new String[leaves.size()];
+    }
+
+    /**
+     * Returns the length of the common prefix of the ancestors of the two leaves, or -1 if their path is too long
+     * or too wide.
+     */
+    public int getCommonPrefix(int source, int target) {
+        int[] sourceStack = ancestors[source];
+        int[] targetStack = ancestors[target];
+        // the path has sourceStack.length + targetStack.length - 2 * commonPrefix nodes
+        int minCommonPrefix = Math.max(1,
+                (sourceStack.length + targetStack.length - m_CommandLineValues.MaxPathLength + 1) / 2);
+        int commonPrefix = Math.min(sourceStack.length, targetStack.length);
+        while (commonPrefix >= minCommonPrefix
+                && sourceStack[sourceStack.length - commonPrefix] != targetStack[targetStack.length - commonPrefix]) {
+            commonPrefix--;
+        }
+        if (commonPrefix < minCommonPrefix) {
+            return -1;
+        }
+
+        int sourceChildIndex = sourceStack.length - commonPrefix - 1;
+        int targetChildIndex = targetStack.length - commonPrefix - 1;
+        if (sourceChildIndex >= 0 && targetChildIndex >= 0) {
+            int pathWidth = getChildId(targetStack[targetChildIndex]) - getChildId(sourceStack[sourceChildIndex]);
+            if (pathWidth > m_CommandLineValues.MaxPathWidth) {
+                return -1;
+            }
+        }
+        return commonPrefix;
+    }
+
+    public String generatePath(int source, int target) {
+        int commonPrefix = getCommonPrefix(source, target);
+        if (commonPrefix < 0) {
+            return Common.EmptyString;
+        }
+        return generatePath(source, target, commonPrefix);
+    }
+
+    public String generatePath(int source, int target, int commonPrefix) {
+        int[] sourceStack = ancestors[source];
+        int[] targetStack = ancestors[target];
+        pathBuilder.setLength(0);
+        if (sourceStack.length - commonPrefix > 0) {
+            pathBuilder.append(getLeafUpString(source));
+        }
+        for (int i = 1; i < sourceStack.length - commonPrefix; i++) {
+            pathBuilder.append(getUpString(sourceStack[i]));
+        }
+        pathBuilder.append(getCommonString(sourceStack[sourceStack.length - commonPrefix]));
+        for (int i = targetStack.length - commonPrefix - 1; i > 0; i--) {
+            pathBuilder.append(getDownString(targetStack[i]));
+        }
+        if (targetStack.length - commonPrefix - 1 >= 0) {
+            pathBuilder.append(getLeafDownString(target));
+        }
+        return pathBuilder.toString();
+    }
+
+    // the leaves themselves always have their child id
+    private String getLeafUpString(int leaf) {
+        if (leafUpStrings[leaf] == null) {
+            int index = ancestors[leaf][0];
+            leafUpStrings[leaf] = getProperty(index).getType(true) + saturateChildId(getChildId(index)) + upSymbol;
+        }
+        return leafUpStrings[leaf];
+    }
+
+    private String getLeafDownString(int leaf) {
+        if (leafDownStrings[leaf] == null) {
+            int index = ancestors[leaf][0];
+            leafDownStrings[leaf] = downSymbol + getProperty(index).getType(true) + saturateChildId(getChildId(index));
+        }
+        return leafDownStrings[leaf];
+    }
+
+    private String getUpString(int index) {
+        if (upStrings[index] == null) {
+            Node node = nodes.get(index);
+            String childId = Common.EmptyString;
+            String parentRawType = node.getParentNode().getUserData(Common.PropertyKey).getRawType();
+            if (s_ParentTypeToAddChildId.contains(parentRawType)) {
+                childId = saturateChildId(getChildId(index)).toString();
+            }
+            upStrings[index] = getProperty(index).getType(true) + childId + upSymbol;
+        }
+        return upStrings[index];
+    }
+
+    private String getCommonString(int index) {
+        if (commonStrings[index] == null) {
+            Node node = nodes.get(index);
+            String childId = Common.EmptyString;
+            Property parentNodeProperty = node.getParentNode().getUserData(Common.PropertyKey);
+            if (parentNodeProperty != null && s_ParentTypeToAddChildId.contains(parentNodeProperty.getRawType())) {
+                childId = saturateChildId(getChildId(index)).toString();
+            }
+            commonStrings[index] = getProperty(index).getType(true) + childId;
+        }
+        return commonStrings[index];
+    }
+
+    private String getDownString(int index) {
+        if (downStrings[index] == null) {
+            String childId = Common.EmptyString;
+            if (s_ParentTypeToAddChildId.contains(getProperty(index).getRawType())) {
+                childId = saturateChildId(getChildId(index)).toString();
+            }
+            downStrings[index] = downSymbol + getProperty(index).getType(true) + childId;
+        }
+        return downStrings[index];
+    }
+
+    private Property getProperty(int index) {
+        return nodes.get(index).getUserData(Common.PropertyKey);
+    }
+
+    private int getChildId(int index) {
+        return nodes.get(index).getUserData(Common.ChildId);
+    }
+
+    private Integer saturateChildId(int childId) {
+        return Math.min(childId, m_CommandLineValues.MaxChildId);
+    }
+}
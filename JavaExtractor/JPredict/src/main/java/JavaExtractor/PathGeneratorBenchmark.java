@@ -0,0 +1,199 @@
+package JavaExtractor;
+
+import JavaExtractor.Common.CommandLineValues;
+import JavaExtractor.Common.Common;
+import JavaExtractor.Common.MethodContent;
+import JavaExtractor.FeaturesEntities.Property;
+import com.github.javaparser.ParseProblemException;
+import com.github.javaparser.ast.Node;
+import org.kohsuke.args4j.CmdLineException;
+
+import java.io.IOException;
+import java.nio.file.Files;
+import java.nio.file.Path;
+import java.nio.file.Paths;
+import java.util.ArrayList;
+import java.util.Collections;
+import java.util.HashSet;
+import java.util.List;
+import java.util.Set;
+import java.util.StringJoiner;
+import java.util.stream.Collectors;
+import java.util.stream.Stream;
+
+/**
+ * A microbenchmark of the path generation. Extracts the methods of a file (--file) or of the .java files of a
+ * directory (--dir), and generates the paths of all the pairs of leaves of every method, with PathGenerator and with
+ * the previous implementation (which collected the ancestors of both leaves and formatted the strings of their nodes
+ * for every pair), checks that both generate the same paths, and prints the contexts per second of each:
+ * java -Drepeats=10 -cp target/JavaExtractor-0.0.1-SNAPSHOT.jar JavaExtractor.PathGeneratorBenchmark \
+ * --max_path_length 8 --max_path_width 2 --dir java_projects/
+ */
+public class PathGeneratorBenchmark {
+    private static final Set<String> s_ParentTypeToAddChildId = Stream
+            .of("AssignExpr", "ArrayAccessExpr", "FieldAccessExpr", "MethodCallExpr")
+            .collect(Collectors.toCollection(HashSet::new));
+    private static CommandLineValues s_CommandLineValues;
+
+    public static void main(String[] args) throws IOException {
+        try {
+            s_CommandLineValues = new CommandLineValues(args);
+        } catch (CmdLineException e) {
+            e.printStackTrace();
+            return;
+        }
+        int repeats = Integer.getInteger("repeats", 10);
+        List<Path> files;
+        if (s_CommandLineValues.File != null) {
+            files = Collections.singletonList(s_CommandLineValues.File.toPath());
+        } else {
+            try (Stream<Path> paths = Files.walk(Paths.get(s_CommandLineValues.Dir))) {
+                files = paths.filter(Files::isRegularFile)
+                        .filter(p -> p.toString().toLowerCase().endsWith(".java")).sorted()
+                        .collect(Collectors.toList());
+            }
+        }
+        ArrayList<MethodContent> methods = new ArrayList<>();
+        for (Path file : files) {
+            String code = new String(Files.readAllBytes(file));
+            try {
+                methods.addAll(new FeatureExtractor(s_CommandLineValues, file).extractMethods(code));
+            } catch (ParseProblemException e) {
+                System.err.println("Skipping " + file + ", it could not be parsed");
+            }
+        }
+
+        long contexts = 0;
+        for (MethodContent method : methods) {
+            PathGenerator pathGenerator = new PathGenerator(s_CommandLineValues, method.getLeaves());
+            ArrayList<Node> leaves = method.getLeaves();
+            for (int i = 0; i < leaves.size(); i++) {
+                for (int j = i + 1; j < leaves.size(); j++) {
+                    String path = pathGenerator.generatePath(i, j);
+                    String expectedPath = generatePathPerPair(leaves.get(i), leaves.get(j));
+                    if (!path.equals(expectedPath)) {
+                        throw new IllegalStateException(String.format("Different paths in %s: %s and %s",
+                                method.getName(), path, expectedPath));
+                    }
+                    if (!path.isEmpty()) {
+                        contexts++;
+                    }
+                }
+            }
+        }
+        System.out.println(String.format("%d methods, %d contexts, identical paths", methods.size(), contexts));
+
+        // the first repeat of each is a warm-up
+        double perPairSeconds = 0;
+        double pathGeneratorSeconds = 0;
+        for (int repeat = 0; repeat <= repeats; repeat++) {
+            long start = System.nanoTime();
+            for (MethodContent method : methods) {
+                ArrayList<Node> leaves = method.getLeaves();
+                for (int i = 0; i < leaves.size(); i++) {
+                    for (int j = i + 1; j < leaves.size(); j++) {
+                        generatePathPerPair(leaves.get(i), leaves.get(j));
+                    }
+                }
+            }
+            long middle = System.nanoTime();
+            for (MethodContent method : methods) {
+                PathGenerator pathGenerator = new PathGenerator(s_CommandLineValues, method.getLeaves());
+                int numLeaves = method.getLeaves().size();
+                for (int i = 0; i < numLeaves; i++) {
+                    for (int j = i + 1; j < numLeaves; j++) {
+                        pathGenerator.generatePath(i, j);
+                    }
+                }
+            }
+            long end = System.nanoTime();
+            if (repeat > 0) {
+                perPairSeconds += (middle - start) / 1e9;
+                pathGeneratorSeconds += (end - middle) / 1e9;
+            }
+        }
+        System.out.println(String.format("per pair ancestors: %.0f contexts/sec", contexts * repeats / perPairSeconds));
+        System.out.println(String.format("PathGenerator:      %.0f contexts/sec",
+                contexts * repeats / pathGeneratorSeconds));
+    }
+
+    // The previous implementation of FeatureExtractor.generatePath
+    private static String generatePathPerPair(Node source, Node target) {
+        StringJoiner stringBuilder = new StringJoiner(Common.EmptyString);
+        ArrayList<Node> sourceStack = getTreeStack(source);
+        ArrayList<Node> targetStack = getTreeStack(target);
+
+        int commonPrefix = 0;
+        int currentSourceAncestorIndex = sourceStack.size() - 1;
+        int currentTargetAncestorIndex = targetStack.size() - 1;
+        while (currentSourceAncestorIndex >= 0 && currentTargetAncestorIndex >= 0
+                && sourceStack.get(currentSourceAncestorIndex) == targetStack.get(currentTargetAncestorIndex)) {
+            commonPrefix++;
+            currentSourceAncestorIndex--;
+            currentTargetAncestorIndex--;
+        }
+
+        int pathLength = sourceStack.size() + targetStack.size() - 2 * commonPrefix;
+        if (pathLength > s_CommandLineValues.MaxPathLength) {
+            return Common.EmptyString;
+        }
+
+        if (currentSourceAncestorIndex >= 0 && currentTargetAncestorIndex >= 0) {
+            int pathWidth = targetStack.get(currentTargetAncestorIndex).getUserData(Common.ChildId)
+                    - sourceStack.get(currentSourceAncestorIndex).getUserData(Common.ChildId);
+            if (pathWidth > s_CommandLineValues.MaxPathWidth) {
+                return Common.EmptyString;
+            }
+        }
+
+        for (int i = 0; i < sourceStack.size() - commonPrefix; i++) {
+            Node currentNode = sourceStack.get(i);
+            String childId = Common.EmptyString;
+            String parentRawType = currentNode.getParentNode().getUserData(Common.PropertyKey).getRawType();
+            if (i == 0 || s_ParentTypeToAddChildId.contains(parentRawType)) {
+                childId = saturateChildId(currentNode.getUserData(Common.ChildId)).toString();
+            }
+            stringBuilder.add(String.format("%s%s%s",
+                    currentNode.getUserData(Common.PropertyKey).getType(true), childId, "|"));
+        }
+
+        Node commonNode = sourceStack.get(sourceStack.size() - commonPrefix);
+        String commonNodeChildId = Common.EmptyString;
+        Property parentNodeProperty = commonNode.getParentNode().getUserData(Common.PropertyKey);
+        String commonNodeParentRawType = Common.EmptyString;
+        if (parentNodeProperty != null) {
+            commonNodeParentRawType = parentNodeProperty.getRawType();
+        }
+        if (s_ParentTypeToAddChildId.contains(commonNodeParentRawType)) {
+            commonNodeChildId = saturateChildId(commonNode.getUserData(Common.ChildId)).toString();
+        }
+        stringBuilder.add(String.format("%s%s",
+                commonNode.getUserData(Common.PropertyKey).getType(true), commonNodeChildId));
+
+        for (int i = targetStack.size() - commonPrefix - 1; i >= 0; i--) {
+            Node currentNode = targetStack.get(i);
+            String childId = Common.EmptyString;
+            if (i == 0 || s_ParentTypeToAddChildId.contains(currentNode.getUserData(Common.PropertyKey).getRawType())) {
+                childId = saturateChildId(currentNode.getUserData(Common.ChildId)).toString();
+            }
+            stringBuilder.add(String.format("%s%s%s", "|",
+                    currentNode.getUserData(Common.PropertyKey).getType(true), childId));
+        }
+
+        return stringBuilder.toString();
+    }
+
+    private static ArrayList<Node> getTreeStack(Node node) {
+        ArrayList<Node> upStack = new ArrayList<>();
+        Node current = node;
+        while (current != null) {
+            upStack.add(current);
+            current = current.getParentNode();
+        }
+        return upStack;
+    }
+
+    private static Integer saturateChildId(int childId) {
+        return Math.min(childId, s_CommandLineValues.MaxChildId);
+    }
+}
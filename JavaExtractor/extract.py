@@ -22,10 +22,16 @@ def ParallelExtractDir(args, dir):
     ExtractFeaturesForDir(args, dir, "")
 
 
+def SamplingArgs(args):
+    if args.max_contexts is None:
+        return []
+    return ['--max_contexts', str(args.max_contexts), '--seed', str(args.seed)]
+
+
 def ExtractFeaturesForDir(args, dir, prefix):
     command = ['java', '-Xmx100g', '-XX:MaxNewSize=60g', '-cp', args.jar, 'JavaExtractor.App',
                '--max_path_length', str(args.max_path_length), '--max_path_width', str(args.max_path_width),
-               '--dir', dir, '--num_threads', str(args.num_threads)]
+               '--dir', dir, '--num_threads', str(args.num_threads)] + SamplingArgs(args)
 
     # print command
     # os.system(command)
@@ -82,11 +88,14 @@ if __name__ == '__main__':
     parser.add_argument("-j", "--jar", dest="jar", required=True)
     parser.add_argument("-dir", "--dir", dest="dir", required=False)
     parser.add_argument("-file", "--file", dest="file", required=False)
+    parser.add_argument("--max_contexts", dest="max_contexts", type=int, required=False,
+                        help="uniformly sample at most this number of contexts per method in the extractor")
+    parser.add_argument("--seed", dest="seed", type=int, required=False, default=239)
     args = parser.parse_args()
 
     if args.file is not None:
         command = 'java -cp ' + args.jar + ' JavaExtractor.App --max_path_length ' + \
-                  str(args.max_path_length) + ' --max_path_width ' + str(args.max_path_width) + ' --file ' + args.file
+                  str(args.max_path_length) + ' --max_path_width ' + str(args.max_path_width) + ' --file ' + args.file + ''.join(' ' + arg for arg in SamplingArgs(args))
         os.system(command)
     elif args.dir is not None:
         subdirs = get_immediate_subdirectories(args.dir)
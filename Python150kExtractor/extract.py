@@ -1,8 +1,14 @@
 import argparse
+import bisect
+import collections
+import contextlib
+import hashlib
 import re
 import json
 import multiprocessing
 import itertools
+import random
+import shutil
 import tqdm
 import joblib
 import numpy as np
@@ -22,6 +28,13 @@ parser.add_argument('--use_nums', type=bool, default=True)
 parser.add_argument('--output_dir', required=True, type=str)
 parser.add_argument('--n_jobs', type=int, default=multiprocessing.cpu_count())
 parser.add_argument('--seed', type=int, default=239)
+parser.add_argument('--max_contexts', type=int, default=0,
+                    help='uniformly sample at most this number of contexts per function (0 - all the contexts)')
+parser.add_argument('--streaming', action='store_true',
+                    help='read the JSON files in ranges of lines in the workers and write sharded outputs, '
+                         'with a memory usage independent of the size of the corpus')
+parser.add_argument('--lines_per_shard', type=int, default=1000,
+                    help='the number of ASTs (lines) of every shard in the streaming mode')
 
 
 def __collect_asts(json_file):
@@ -34,69 +47,125 @@ def __collect_asts(json_file):
     return asts
 
 
-def __terminals(ast, node_index, args):
-    stack, paths = [], []
-
-    def dfs(v):
-        stack.append(v)
-
-        v_node = ast[v]
-
-        if 'value' in v_node:
-            if v == node_index:  # Top-level func def node.
-                if args.use_method_name:
-                    paths.append((stack.copy(), METHOD_NAME))
-            else:
+def __traverse(ast, args):
+    # A single (iterative) DFS of the whole AST, shared by the samples of all its FunctionDefs.
+    # Returns the parent and the depth of every node, the DFS-ordered list of terminals (node, value), for every
+    # node the range [subtree_starts[v], subtree_ends[v]) of the terminals in its subtree, and for every depth
+    # the (sorted) indices of the terminals at that depth.
+    # The name of a FunctionDef is a terminal only in its own sample, so it is not in the list.
+    parents, depths = [-1] * len(ast), [0] * len(ast)
+    subtree_starts, subtree_ends = [0] * len(ast), [0] * len(ast)
+    terminals = []
+    terminals_by_depth = collections.defaultdict(list)
+    visited = [False] * len(ast)
+
+    for root in range(len(ast)):
+        if visited[root]:
+            continue
+        stack = [(root, False)]
+        while stack:
+            v, finished = stack.pop()
+            if finished:
+                subtree_ends[v] = len(terminals)
+                continue
+            visited[v] = True
+            subtree_starts[v] = len(terminals)
+
+            v_node = ast[v]
+            if 'value' in v_node:
                 v_type = v_node['type']
-
-                if v_type.startswith('Name'):
-                    paths.append((stack.copy(), v_node['value']))
-                elif args.use_nums and v_type == 'Num':
-                    paths.append((stack.copy(), NUM))
-                else:
-                    pass
-
-        if 'children' in v_node:
-            for child in v_node['children']:
-                dfs(child)
-
-        stack.pop()
-
-    dfs(node_index)
-
-    return paths
-
-
-def __merge_terminals2_paths(v_path, u_path):
-    s, n, m = 0, len(v_path), len(u_path)
-    while s < min(n, m) and v_path[s] == u_path[s]:
-        s += 1
-
-    prefix = list(reversed(v_path[s:]))
-    lca = v_path[s - 1]
-    suffix = u_path[s:]
-
-    return prefix, lca, suffix
-
-
-def __raw_tree_paths(ast, node_index, args):
-    tnodes = __terminals(ast, node_index, args)
+                if v_type.startswith('Name') or (args.use_nums and v_type == 'Num'):
+                    terminals_by_depth[depths[v]].append(len(terminals))
+                    terminals.append((v, v_node['value'] if v_type.startswith('Name') else NUM))
+
+            stack.append((v, True))
+            for child in reversed(v_node.get('children', [])):
+                parents[child] = v
+                depths[child] = depths[v] + 1
+                stack.append((child, False))
+
+    return parents, depths, subtree_starts, subtree_ends, terminals, terminals_by_depth
+
+
+def __path_to_ancestor(parents, v, ancestor):
+    # [v, parent of v, ..., ancestor]
+    path = [v]
+    while v != ancestor:
+        v = parents[v]
+        path.append(v)
+    return path
+
+
+def __reservoir_sample(items, num_samples, rng):
+    # Uniformly samples num_samples of the items in a single pass (reservoir sampling, like the C# extractor),
+    # and returns them in their original order
+    sampled = []
+    for seen, item in enumerate(items):
+        if len(sampled) < num_samples:
+            sampled.append((seen, item))
+        else:
+            position = rng.randrange(seen + 1)
+            if position < num_samples:
+                sampled[position] = (seen, item)
+    sampled.sort(key=lambda seen_item: seen_item[0])
+    return [item for _, item in sampled]
+
+
+def __raw_tree_paths(ast, node_index, traversal, args):
+    # With max_contexts, the pairs are sampled before their paths are built
+    parents = traversal[0]
+    pairs = __tree_path_pairs(ast, node_index, traversal, args)
+    if args.max_contexts > 0:
+        pairs = __reservoir_sample(pairs, args.max_contexts, random.Random(args.seed))
 
     tree_paths = []
-    for (v_path, v_value), (u_path, u_value) in itertools.combinations(
-            iterable=tnodes,
-            r=2,
-    ):
-        prefix, lca, suffix = __merge_terminals2_paths(v_path, u_path)
-        if (len(prefix) + 1 + len(suffix) <= args.max_path_length) \
-                and (abs(len(prefix) - len(suffix)) <= args.max_path_width):
-            path = prefix + [lca] + suffix
-            tree_path = v_value, path, u_value
-            tree_paths.append(tree_path)
+    for v, v_value, lca, u, u_value in pairs:
+        path = __path_to_ancestor(parents, v, lca) + __path_to_ancestor(parents, u, lca)[-2::-1]
+        tree_path = v_value, path, u_value
+        tree_paths.append(tree_path)
 
     return tree_paths
 
 
+def __tree_path_pairs(ast, node_index, traversal, args):
+    # Generates (v, v_value, lca, u, u_value) for every pair of terminals of the function that has a valid path
+    parents, depths, subtree_starts, subtree_ends, all_terminals, terminals_by_depth = traversal
+    start = subtree_starts[node_index]
+    tnodes = all_terminals[start:subtree_ends[node_index]]
+    if args.use_method_name and 'value' in ast[node_index]:
+        tnodes = [(node_index, METHOD_NAME)] + tnodes
+    # the index in tnodes of the global terminal index i is i + offset
+    offset = len(tnodes) - (subtree_ends[node_index] - start) - start
+    root_depth = depths[node_index]
+
+    # For every terminal v, the pairs (v, u) with u after v are generated grouped by their LCA, from the deepest:
+    # the terminals in the subtree of v's ancestor at depth s (and not in the subtree of its ancestor at depth s + 1)
+    # have an LCA at depth s with v. Between terminals at depths n and m, the path has n + m - 2s + 1 nodes, and
+    # m >= n - max_path_width, so ancestors shallower than min_lca_depth cannot be the LCA of any valid pair.
+    # For every LCA, only the terminals at the depths m that fit are looked up, so the work does not depend on the
+    # number of terminals that are too deep or too shallow. Depths are counted from the FunctionDef (depth 1),
+    # and the pairs are generated in the same order as all the combinations of terminals.
+    for v_index, (v, v_value) in enumerate(tnodes):
+        n = depths[v] - root_depth + 1
+        min_lca_depth = max(1, (2 * n - args.max_path_width + 1 - args.max_path_length + 1) // 2)
+        u_start = v_index + 1
+        lca = v
+        for lca_depth in range(n, min_lca_depth - 1, -1):
+            u_end = subtree_ends[lca] + offset
+            u_indices = []
+            for m in range(max(n - args.max_path_width, lca_depth),
+                           min(n + args.max_path_width, args.max_path_length - 1 + 2 * lca_depth - n) + 1):
+                depth_terminals = terminals_by_depth.get(m + root_depth - 1, [])
+                u_indices.extend(index + offset for index in depth_terminals[
+                    bisect.bisect_left(depth_terminals, u_start - offset):
+                    bisect.bisect_left(depth_terminals, u_end - offset)])
+            for u_index in sorted(u_indices):
+                u, u_value = tnodes[u_index]
+                yield v, v_value, lca, u, u_value
+            u_start = max(u_start, u_end)
+            lca = parents[lca]
+
+
 def __delim_name(name):
     if name in {METHOD_NAME, NUM}:
         return name
@@ -115,14 +184,14 @@ def __delim_name(name):
     return '|'.join(block.lower() for block in blocks)
 
 
-def __collect_sample(ast, fd_index, args):
+def __collect_sample(ast, fd_index, traversal, args):
     root = ast[fd_index]
     if root['type'] != 'FunctionDef':
         raise ValueError('Wrong node type.')
 
     target = root['value']
 
-    tree_paths = __raw_tree_paths(ast, fd_index, args)
+    tree_paths = __raw_tree_paths(ast, fd_index, traversal, args)
     contexts = []
     for tree_path in tree_paths:
         start, connector, finish = tree_path
@@ -143,10 +212,11 @@ def __collect_sample(ast, fd_index, args):
 
 
 def __collect_samples(ast, args):
+    traversal = __traverse(ast, args)
     samples = []
     for node_index, node in enumerate(ast):
         if node['type'] == 'FunctionDef':
-            sample = __collect_sample(ast, node_index, args)
+            sample = __collect_sample(ast, node_index, traversal, args)
             if sample is not None:
                 samples.append(sample)
 
@@ -165,8 +235,85 @@ def __collect_all_and_save(asts, args, output_file):
             f.write(line + ('' if line_index == len(samples) - 1 else '\n'))
 
 
+def __line_shards(json_file, lines_per_shard):
+    # The (byte offset, first line number) of every range of lines_per_shard lines, in a single pass over the file
+    shards = []
+    offset = 0
+    with open(json_file, 'rb') as f:
+        for line_number, line in enumerate(f):
+            if line_number % lines_per_shard == 0:
+                shards.append((offset, line_number))
+            offset += len(line)
+
+    return shards
+
+
+def __is_valid(line_number, args):
+    # A seeded hash of the line number, so that the split does not depend on the sharding or on the order of the workers
+    digest = hashlib.blake2b(f'{args.seed}:{line_number}'.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') < args.valid_p * 2 ** 64
+
+
+def __shard_file(output_dir, split_name, shard_index):
+    return output_dir / f'{split_name}_output_file.txt.shard{shard_index:06d}'
+
+
+def __extract_shard(json_file, shard_index, offset, first_line, split_names, args):
+    # Extracts the ASTs of a range of lines of json_file, and writes the samples of every split to its own shard.
+    # The split of every line is split_names[0], or split_names[1] (valid) by __is_valid, if given.
+    output_dir = Path(args.output_dir)
+    num_samples = collections.Counter()
+    with contextlib.ExitStack() as stack:
+        output_files = {}
+        with open(json_file, 'rb') as f:
+            f.seek(offset)
+            for line_number, line in enumerate(itertools.islice(f, args.lines_per_shard), first_line):
+                is_valid = len(split_names) > 1 and __is_valid(line_number, args)
+                split_name = split_names[1] if is_valid else split_names[0]
+                if split_name not in output_files:
+                    output_files[split_name] = stack.enter_context(
+                        open(__shard_file(output_dir, split_name, shard_index), 'w'))
+                for sample in __collect_samples(json.loads(line), args):
+                    output_files[split_name].write(sample + '\n')
+                    num_samples[split_name] += 1
+
+    return num_samples
+
+
+def __stream_extract_and_save(json_file, split_names, args):
+    # The workers get only the range of lines to read, and write their samples directly, so neither the ASTs
+    # nor the samples are sent between the processes. The shards are then concatenated in order.
+    output_dir = Path(args.output_dir)
+    shards = __line_shards(json_file, args.lines_per_shard)
+    parallel = joblib.Parallel(n_jobs=args.n_jobs)
+    func = joblib.delayed(__extract_shard)
+    num_samples = sum(parallel(func(json_file, shard_index, offset, first_line, split_names, args)
+                               for shard_index, (offset, first_line) in enumerate(tqdm.tqdm(shards))),
+                      collections.Counter())
+
+    for split_name in split_names:
+        with open(output_dir / f'{split_name}_output_file.txt', 'wb') as output_file:
+            for shard_index in range(len(shards)):
+                shard_file = __shard_file(output_dir, split_name, shard_index)
+                if shard_file.exists():
+                    with open(shard_file, 'rb') as f:
+                        shutil.copyfileobj(f, output_file)
+                    shard_file.unlink()
+            # like __collect_all_and_save, no newline after the last sample
+            if output_file.tell() > 0:
+                output_file.truncate(output_file.tell() - 1)
+        print(f'{split_name}: {num_samples[split_name]} samples')
+
+
 def main():
     args = parser.parse_args()
+    if args.streaming:
+        data_dir = Path(args.data_dir)
+        Path(args.output_dir).mkdir(exist_ok=True)
+        __stream_extract_and_save(data_dir / 'python100k_train.json', ('train', 'valid'), args)
+        __stream_extract_and_save(data_dir / 'python50k_eval.json', ('test',), args)
+        return
+
     np.random.seed(args.seed)
 
     data_dir = Path(args.data_dir)
@@ -0,0 +1,97 @@
+import copy
+import glob
+import multiprocessing
+import os
+import queue
+import threading
+import traceback
+
+
+def evaluation_worker(config, checkpoints_queue, results_queue):
+    # Runs in a separate process: builds the evaluation graph once, and evaluates every checkpoint it receives.
+    from model import Model
+
+    model = None
+    while True:
+        job = checkpoints_queue.get()
+        if job is None:
+            break
+        epochs_trained, checkpoint_path = job
+        try:
+            config.LOAD_PATH = checkpoint_path
+            if model is None:
+                model = Model(config)
+            results = model.evaluate()
+            results_queue.put((epochs_trained, checkpoint_path, results, None))
+        except Exception:
+            results_queue.put((epochs_trained, checkpoint_path, None, traceback.format_exc()))
+    if model is not None:
+        model.close_session()
+
+
+class AsyncEvaluator:
+    poll_interval_seconds = 10
+
+    def __init__(self, config):
+        evaluator_config = copy.deepcopy(config)
+        evaluator_config.TRAIN_PATH = None
+        # the evaluation process is a daemon, and cannot start the processes of a sharded evaluation
+        evaluator_config.NUM_EVAL_WORKERS = 1
+        evaluator_config.PS_HOSTS, evaluator_config.WORKER_HOSTS = [], []
+        if config.TELEMETRY_PATH:
+            evaluator_config.TELEMETRY_PATH = config.TELEMETRY_PATH + '.evaluator'
+        if config.PROFILE_PATH:
+            evaluator_config.PROFILE_PATH = os.path.join(config.PROFILE_PATH, 'evaluator')
+        # TensorFlow is not fork-safe, the evaluator process starts a fresh interpreter
+        context = multiprocessing.get_context('spawn')
+        self.checkpoints_queue = context.Queue()
+        self.results_queue = context.Queue()
+        self.num_pending = 0
+        # submit() may be called from the checkpoint writer thread
+        self.num_pending_lock = threading.Lock()
+        self.process = context.Process(target=evaluation_worker,
+                                       args=(evaluator_config, self.checkpoints_queue, self.results_queue),
+                                       daemon=True)
+        self.process.start()
+        print('Started evaluation process (pid %d)' % self.process.pid)
+
+    def submit(self, epochs_trained, checkpoint_path):
+        with self.num_pending_lock:
+            self.num_pending += 1
+        self.checkpoints_queue.put((epochs_trained, checkpoint_path))
+
+    def get_finished_results(self, wait_for_all=False):
+        # Returns a list of (epochs_trained, checkpoint_path, evaluation_results), in the order of submission
+        finished = []
+        while self.num_pending > 0:
+            try:
+                if wait_for_all:
+                    result = self.results_queue.get(timeout=self.poll_interval_seconds)
+                else:
+                    result = self.results_queue.get_nowait()
+            except queue.Empty:
+                if not wait_for_all:
+                    break
+                if not self.process.is_alive():
+                    raise RuntimeError('Evaluation process exited with code %s' % str(self.process.exitcode))
+                continue
+            epochs_trained, checkpoint_path, results, error = result
+            with self.num_pending_lock:
+                self.num_pending -= 1
+            if error is not None:
+                raise RuntimeError('Evaluation of %s failed:\n%s' % (checkpoint_path, error))
+            finished.append((epochs_trained, checkpoint_path, results))
+        return finished
+
+    def close(self):
+        if self.process.is_alive():
+            if self.num_pending > 0:
+                self.process.terminate()
+            else:
+                self.checkpoints_queue.put(None)
+            self.process.join()
+
+    @staticmethod
+    def delete_checkpoint(checkpoint_path):
+        for path in glob.glob(glob.escape(checkpoint_path) + '.*'):
+            os.remove(path)
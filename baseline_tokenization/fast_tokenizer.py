@@ -0,0 +1,65 @@
+import re
+
+'''
+A fast path for javalang.tokenizer, for the common case: a single precompiled regular expression that matches
+the Java lexical classes, and returns the same token values as javalang.
+It returns None for any input that it does not handle exactly like javalang (non-ASCII characters, unicode escapes,
+characters that are not Java tokens, unusual numeric literals, or a token that javalang fails on at the end of the
+input), in which case the caller falls back to javalang.
+'''
+
+_DIGITS = r'\d(?:_*\d)*'
+
+# javalang's operators (the longest one is matched), except for '...' (matched with the separators), and without
+# '>>' and '>>>', which javalang lexes as separate '>'
+_OPERATORS = r'>>>?= | <<=? | \+[+=]? | -[-=>]? | &[&=]? | \|[|=]? | ::? | [%^/*!=<>]=? | [?~]'
+
+# The groups are: 1 - whitespace and comments, 2 - identifiers (and keywords), 3 - numeric literals, 4 - all other
+# tokens. The only character that starts more than one group is '.', which starts a number only before a digit.
+_TOKEN_RE = re.compile(r'''
+    (\s+ | //[^\n]* | /\*.*?(?:\*/|\Z))
+  | ([A-Za-z_$][A-Za-z0-9_$]*)
+  | (\.{digits}(?:[eE][+-]?(?:{digits})?)?[fFdD]?
+      | 0[xX][0-9a-fA-F](?:_*[0-9a-fA-F])*[lL]?
+      | 0[bB][01](?:_*[01])*[lL]?
+      | 0[0-7](?:_*[0-7])*[lL]?
+      | {digits}[lL]
+      | {digits}(?:\.(?:{digits})?)?(?:[eE][+-]?(?:{digits})?)?[fFdD]?)
+  | (\.\.\.
+      | [(){{}}\[\];,.@]
+      | {operators}
+      | "(?:[^"\\]|\\[btnfru"'\\0-7])*"
+      | '(?:[^'\\]|\\[btnfru"'\\0-7])*')
+'''.format(digits=_DIGITS, operators=_OPERATORS), re.VERBOSE | re.DOTALL)
+_SKIP, _IDENTIFIER, _NUMBER = 1, 2, 3
+
+# Characters after a numeric literal that javalang may read as part of it (with its own quirks)
+_NUMBER_CONTINUATIONS = frozenset('0123456789_.lLeEfFdDpPxXbB')
+
+
+def tokenize(code):
+    # Returns the list of token values of code, or None if it should be tokenized by javalang
+    if not code.isascii() or '\\u' in code:
+        return None
+    values = []
+    position = 0
+    length = len(code)
+    last_kind = last_end = None
+    for match in _TOKEN_RE.finditer(code):
+        if match.start() != position:
+            # a character that is not a Java token
+            return None
+        position = match.end()
+        kind = match.lastindex
+        if kind == _SKIP:
+            continue
+        if kind == _NUMBER and position < length and code[position] in _NUMBER_CONTINUATIONS:
+            return None
+        values.append(match.group(kind))
+        last_kind, last_end = kind, position
+    if position != length:
+        return None
+    if last_end == length and (last_kind in (_NUMBER, _IDENTIFIER) or values[-1] == '.'):
+        # javalang reads past the end of the input after these tokens, and fails
+        return None
+    return values
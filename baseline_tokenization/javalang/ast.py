@@ -14,12 +14,24 @@ class MetaNode(type):
 
         dict['attrs'].extend(attrs)
 
+        # The attributes are stored in slots instead of a __dict__ per node. Every class gets slots for its
+        # attributes that are not stored by its bases, unless it sets its own __slots__: a class that is mixed into
+        # other nodes sets empty __slots__ (two bases with slots would conflict), and its attributes are stored by
+        # its subclasses, and a class that the parser sets other attributes on lists them too
+        if '__slots__' not in dict:
+            stored = set()
+            for base in bases:
+                for cls in base.__mro__:
+                    stored.update(cls.__dict__.get('__slots__', ()))
+            dict['__slots__'] = tuple(attr for attr in dict['attrs'] if attr not in stored)
+
         return type.__new__(mcs, name, bases, dict)
 
 
 @six.add_metaclass(MetaNode)
 class Node(object):
     attrs = ()
+    __slots__ = ('_position',)
 
     def __init__(self, **kwargs):
         values = kwargs.copy()
@@ -58,18 +70,27 @@ class Node(object):
         return [getattr(self, attr_name) for attr_name in self.attrs]
 
 def walk_tree(root):
-    children = None
-
+    # Yields the (path, node) pairs of the tree in preorder, where path is the tuple of the ancestors of node
+    # (including the lists of children), with a stack of the paths and iterators of the children instead of recursion
     if isinstance(root, Node):
         yield (), root
         children = root.children
     else:
         children = root
 
-    for child in children:
-        if isinstance(child, (Node, list, tuple)):
-            for path, node in walk_tree(child):
-                yield (root,) + path, node
+    stack = [((root,), iter(children))]
+    while stack:
+        path, children = stack[-1]
+        for child in children:
+            if isinstance(child, Node):
+                yield path, child
+                stack.append((path + (child,), iter(child.children)))
+                break
+            if isinstance(child, (list, tuple)):
+                stack.append((path + (child,), iter(child)))
+                break
+        else:
+            stack.pop()
 
 def dump(ast, file):
     pickle.dump(ast, file)
@@ -140,11 +140,74 @@ class Identifier(JavaToken):
     pass
 
 
+IDENT_START_CATEGORIES = set(['Lu', 'Ll', 'Lt', 'Lm', 'Lo', 'Nl', 'Pc', 'Sc'])
+
+IDENT_PART_CATEGORIES = set(['Lu', 'Ll', 'Lt', 'Lm', 'Lo', 'Mc', 'Mn', 'Nd', 'Nl', 'Pc', 'Sc'])
+
+# The kinds of characters that JavaTokenizer.tokenize dispatches on
+(WHITESPACE, SLASH, DOT, AT, SEPARATOR, QUOTE, DIGIT, IDENT_START, OPERATOR_START,
+ ILLEGAL) = range(10)
+
+def build_operator_trie(operators):
+    # Maps every character of an operator to the next node, and '' to True at the
+    # end of an operator
+    trie = dict()
+
+    for operator in operators:
+        node = trie
+        for c in operator:
+            node = node.setdefault(c, dict())
+        node[''] = True
+
+    return trie
+
+OPERATOR_TRIE = build_operator_trie(Operator.VALUES)
+
+def get_character_kind(c):
+    # The first check that applies to the character (tokenize also looks at the
+    # next character after a '/' or a '.')
+    if c.isspace():
+        return WHITESPACE
+    elif c == '/':
+        return SLASH
+    elif c == '.':
+        return DOT
+    elif c == '@':
+        return AT
+    elif c in Separator.VALUES:
+        return SEPARATOR
+    elif c in ("'", '"'):
+        return QUOTE
+    elif c in '0123456789':
+        return DIGIT
+    elif unicodedata.category(c) in IDENT_START_CATEGORIES:
+        return IDENT_START
+    elif c in OPERATOR_TRIE:
+        return OPERATOR_START
+    else:
+        return ILLEGAL
+
+ASCII_CHARACTER_KINDS = dict((six.unichr(i), get_character_kind(six.unichr(i)))
+                             for i in range(128))
+
+ASCII_IDENT_PART = ''.join(six.unichr(i) for i in range(128)
+                           if unicodedata.category(six.unichr(i)) in IDENT_PART_CATEGORIES)
+
+IDENTIFIER_TYPES = dict()
+IDENTIFIER_TYPES.update((value, Boolean) for value in Boolean.VALUES)
+IDENTIFIER_TYPES['null'] = Null
+IDENTIFIER_TYPES.update((value, Keyword) for value in Keyword.VALUES)
+IDENTIFIER_TYPES.update((value, Modifier) for value in Modifier.VALUES)
+IDENTIFIER_TYPES.update((value, BasicType) for value in BasicType.VALUES)
+
+
 class JavaTokenizer(object):
 
-    IDENT_START_CATEGORIES = set(['Lu', 'Ll', 'Lt', 'Lm', 'Lo', 'Nl', 'Pc', 'Sc'])
+    IDENT_START_CATEGORIES = IDENT_START_CATEGORIES
+
+    IDENT_PART_CATEGORIES = IDENT_PART_CATEGORIES
 
-    IDENT_PART_CATEGORIES = set(['Lu', 'Ll', 'Lt', 'Lm', 'Lo', 'Mc', 'Mn', 'Nd', 'Nl', 'Pc', 'Sc'])
+    ident_part_consumer = re.compile('[%s]*' % re.escape(ASCII_IDENT_PART))
 
     def __init__(self, data):
         self.data = data
@@ -152,11 +215,6 @@ class JavaTokenizer(object):
         self.current_line = 1
         self.start_of_line = 0
 
-        self.operators = [set() for i in range(0, Operator.MAX_LEN)]
-
-        for v in Operator.VALUES:
-            self.operators[len(v) - 1].add(v)
-
         self.whitespace_consumer = re.compile(r'[^\s]')
 
         self.javadoc = None
@@ -232,11 +290,24 @@ class JavaTokenizer(object):
         self.j = j + 1
 
     def try_operator(self):
-        for l in range(min(self.length - self.i, Operator.MAX_LEN), 0, -1):
-            if self.data[self.i:self.i + l] in self.operators[l - 1]:
-                self.j = self.i + l
-                return True
-        return False
+        # Longest match in the trie of the operators
+        node = OPERATOR_TRIE
+        end = None
+        j = self.i
+
+        while j < self.length:
+            node = node.get(self.data[j])
+            if node is None:
+                break
+            j += 1
+            if '' in node:
+                end = j
+
+        if end is None:
+            return False
+
+        self.j = end
+        return True
 
     def read_comment(self):
         if self.data[self.i + 1] == '/':
@@ -414,33 +485,31 @@ class JavaTokenizer(object):
         return unicodedata.category(c) in self.IDENT_START_CATEGORIES
 
     def read_identifier(self):
-        self.j = self.i + 1
-
-        while unicodedata.category(self.data[self.j]) in self.IDENT_PART_CATEGORIES:
-            self.j += 1
+        j = self.i + 1
 
-        ident = self.data[self.i:self.j]
-        if ident in Keyword.VALUES:
-            token_type = Keyword
+        while True:
+            j = self.ident_part_consumer.match(self.data, j).end()
 
-            if ident in BasicType.VALUES:
-                token_type = BasicType
-            elif ident in Modifier.VALUES:
-                token_type = Modifier
+            # Fails at the end of the input, like reading one character at a time
+            c = self.data[j]
+            if c < u'\x80' or unicodedata.category(c) not in self.IDENT_PART_CATEGORIES:
+                break
+            j += 1
 
-        elif ident in Boolean.VALUES:
-            token_type = Boolean
-        elif ident == 'null':
-            token_type = Null
-        else:
-            token_type = Identifier
+        self.j = j
 
-        return token_type
+        return IDENTIFIER_TYPES.get(self.data[self.i:j], Identifier)
 
     def pre_tokenize(self):
         new_data = list()
         data = self.decode_data()
 
+        if u'\\u' not in data:
+            # No unicode escapes to convert
+            self.data = data
+            self.length = len(data)
+            return
+
         i = 0
         j = 0
         length = len(data)
@@ -501,70 +570,83 @@ class JavaTokenizer(object):
         # Convert unicode escapes
         self.pre_tokenize()
 
-        while self.i < self.length:
+        data = self.data
+        length = self.length
+        kinds = ASCII_CHARACTER_KINDS
+
+        while self.i < length:
+            i = self.i
             token_type = None
 
-            c = self.data[self.i]
+            c = data[i]
             c_next = None
-            startswith = c
 
-            if self.i + 1 < self.length:
-                c_next = self.data[self.i + 1]
-                startswith = c + c_next
+            if i + 1 < length:
+                c_next = data[i + 1]
+
+            kind = kinds.get(c)
+            if kind is None:
+                kind = get_character_kind(c)
+
+            if kind == IDENT_START:
+                token_type = self.read_identifier()
 
-            if c.isspace():
+            elif kind == WHITESPACE:
                 self.consume_whitespace()
                 continue
 
-            elif startswith in ("//", "/*"):
-                if startswith == "/*" and self.try_javadoc_comment():
-                    self.javadoc = self.data[self.i:self.j]
+            elif kind == SEPARATOR:
+                token_type = Separator
+                self.j = i + 1
+
+            elif kind == OPERATOR_START:
+                if not self.try_operator():
+                    self.error('Could not process token', c)
+                token_type = Operator
+
+            elif kind == DOT:
+                if c_next == '.' and self.try_operator():
+                    # '...'
+                    token_type = Operator
+                elif c_next.isdigit():
+                    token_type = self.read_decimal_float_or_integer()
+                else:
+                    token_type = Separator
+                    self.j = i + 1
+
+            elif kind == SLASH and c_next in ('/', '*'):
+                if c_next == '*' and self.try_javadoc_comment():
+                    self.javadoc = data[i:self.j]
                     self.i = self.j
                 else:
                     self.read_comment()
                 continue
 
-            elif startswith == '..' and self.try_operator():
-                # Ensure we don't mistake a '...' operator as a sequence of
-                # three '.' separators. This is done as an optimization instead
-                # of moving try_operator higher in the chain because operators
-                # aren't as common and try_operator is expensive
+            elif kind == SLASH:
+                self.try_operator()
                 token_type = Operator
 
-            elif c == '@':
-                token_type = Annotation
-                self.j = self.i + 1
-
-            elif c == '.' and c_next.isdigit():
-                token_type = self.read_decimal_float_or_integer()
-
-            elif self.try_separator():
-                token_type = Separator
-
-            elif c in ("'", '"'):
+            elif kind == QUOTE:
                 token_type = String
                 self.read_string()
 
-            elif c in '0123456789':
+            elif kind == DIGIT:
                 token_type = self.read_integer_or_float(c, c_next)
 
-            elif self.is_java_identifier_start(c):
-                token_type = self.read_identifier()
-
-            elif self.try_operator():
-                token_type = Operator
+            elif kind == AT:
+                token_type = Annotation
+                self.j = i + 1
 
             else:
                 self.error('Could not process token', c)
 
-            position = (self.current_line, self.i - self.start_of_line)
-            token = token_type(self.data[self.i:self.j], position, self.javadoc)
-            yield token
+            j = self.j
+            yield token_type(data[i:j], (self.current_line, i - self.start_of_line), self.javadoc)
 
             if self.javadoc:
                 self.javadoc = None
 
-            self.i = self.j
+            self.i = j
 
     def error(self, message, char=None):
         # Provide additional information in the errors message
@@ -11,6 +11,8 @@ class Import(Node):
 
 class Documented(Node):
     attrs = ("documentation",)
+    # mixed into declarations, which store its attribute
+    __slots__ = ()
 
 class Declaration(Node):
     attrs = ("modifiers", "annotations")
@@ -79,6 +81,8 @@ class ElementArrayValue(Node):
 
 class Member(Documented):
     attrs = ()
+    # mixed into declarations, which store its attribute
+    __slots__ = ()
 
 class MethodDeclaration(Member, Declaration):
     attrs = ("type_parameters", "return_type", "name", "parameters", "throws", "body")
@@ -185,6 +189,8 @@ class EnhancedForControl(Node):
 
 class Expression(Node):
     attrs = ()
+    # the parser sets these on any parenthesized expression, not only on primaries
+    __slots__ = ("prefix_operators", "postfix_operators", "selectors")
 
 class Assignment(Expression):
     attrs = ("expressionl", "value", "type")
@@ -269,4 +275,6 @@ class EnumConstantDeclaration(Declaration, Documented):
 
 class AnnotationMethod(Declaration):
     attrs = ("name", "return_type", "dimensions", "default")
+    # the parser sets the documentation of any interface member
+    __slots__ = ("name", "return_type", "dimensions", "default", "documentation")
 
@@ -1,8 +1,22 @@
 #!/usr/bin/python
 
-import javalang
-import sys
+import contextlib
+import functools
+import itertools
+import multiprocessing
 import re
+from argparse import ArgumentParser
+
+import javalang
+
+import fast_tokenizer
+
+'''
+Tokenizes and subtokenizes the body of every method in a file of method_name|method body lines.
+The methods are tokenized by a fast regular expression tokenizer (fast_tokenizer.py), with javalang as the fallback
+for the inputs that it does not handle, in --num_workers processes. The outputs are written to
+<file>method_names.txt and <file>method_subtokens_content.txt, in the order of the input.
+'''
 
 
 modifiers = ['public', 'private', 'protected', 'static']
@@ -19,32 +33,72 @@ RE_WORDS = re.compile(r'''
 def split_subtokens(str):
     return [subtok for subtok in RE_WORDS.findall(str) if not subtok == '_']
 
-def tokenizeFile(file_path):
+def tokenize_method(method_content, javalang_only=False):
+  # Returns the token values of the method, or None if javalang fails to tokenize it
+  if not javalang_only:
+    values = fast_tokenizer.tokenize(method_content)
+    if values is not None:
+      return values
+  try:
+    return [token.value for token in javalang.tokenizer.tokenize(method_content)]
+  except Exception:
+    return None
+
+def tokenize_lines(lines, javalang_only=False):
+  # Returns, for every line, either its (method name, subtokenized content), or an error message
+  results = []
+  for line in lines:
+    parts = line.rstrip().split('|', 1)
+    if len(parts) < 2:
+      results.append('ERROR in line: ' + line.rstrip())
+      continue
+    method_name, method_content = parts
+    tokens = tokenize_method(method_content, javalang_only)
+    if tokens is None:
+      results.append('ERROR in tokenizing: ' + method_content)
+    elif len(method_name) > 0 and len(tokens) > 0:
+      results.append((method_name, ' '.join([' '.join(split_subtokens(i)) for i in tokens if not i in modifiers])))
+    else:
+      results.append('ERROR in len of: ' + method_name + ', tokens: ' + str(tokens))
+  return results
+
+def read_chunks(file, chunk_size):
+  while True:
+    chunk = list(itertools.islice(file, chunk_size))
+    if not chunk:
+      return
+    yield chunk
+
+def tokenizeFile(file_path, num_workers=1, chunk_size=1000, javalang_only=False):
+  # The chunks of lines are tokenized by num_workers processes, and written in the order of the input file
   lines = 0
+  tokenize_chunk = functools.partial(tokenize_lines, javalang_only=javalang_only)
   with open(file_path, 'r', encoding="utf-8") as file:
     with open(file_path + 'method_names.txt', 'w') as method_names_file:
       with open(file_path + 'method_subtokens_content.txt', 'w') as method_contents_file:
-        for line in file:
-          lines += 1
-          line = line.rstrip()
-          parts = line.split('|', 1)
-          method_name = parts[0]
-          method_content = parts[1]
-          try:
-            tokens = list(javalang.tokenizer.tokenize(method_content))
-          except:
-            print('ERROR in tokenizing: ' + method_content)
-            #tokens = method_content.split(' ')
-          if len(method_name) > 0 and len(tokens) > 0:
-            method_names_file.write(method_name + '\n')
-            method_contents_file.write(' '.join([' '.join(split_subtokens(i.value)) for i in tokens if not i.value in modifiers]) + '\n')
-          else:
-            print('ERROR in len of: ' + method_name + ', tokens: ' + str(tokens))
+        with multiprocessing.Pool(num_workers) if num_workers > 1 else contextlib.nullcontext() as pool:
+          chunks = read_chunks(file, chunk_size)
+          results = pool.imap(tokenize_chunk, chunks) if pool is not None else map(tokenize_chunk, chunks)
+          for chunk_results in results:
+            for result in chunk_results:
+              lines += 1
+              if isinstance(result, str):
+                print(result)
+                continue
+              method_name, method_content = result
+              method_names_file.write(method_name + '\n')
+              method_contents_file.write(method_content + '\n')
   print(str(lines))
 
 
 if __name__ == '__main__':
-  file = sys.argv[1]
-  tokenizeFile(file)
-
-
+  parser = ArgumentParser()
+  parser.add_argument("file", help="a file of method_name|method body lines")
+  parser.add_argument("--num_workers", dest="num_workers", type=int, required=False,
+                      default=multiprocessing.cpu_count())
+  parser.add_argument("--chunk_size", dest="chunk_size", type=int, required=False, default=1000,
+                      help="the number of lines that are sent to a worker at once")
+  parser.add_argument("--javalang_only", dest="javalang_only", action='store_true', required=False,
+                      help="tokenize all the methods with javalang, without the fast tokenizer")
+  args = parser.parse_args()
+  tokenizeFile(args.file, args.num_workers, args.chunk_size, args.javalang_only)
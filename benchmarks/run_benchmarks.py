@@ -0,0 +1,277 @@
+import os
+
+# the benchmarks are defined for CPU-only machines
+os.environ.setdefault('CUDA_VISIBLE_DEVICES', '')
+
+import copy
+import json
+import multiprocessing
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from argparse import ArgumentParser, Namespace
+
+import numpy as np
+import tensorflow as tf
+
+import preprocess
+import reader
+import synthetic_dataset
+from common import Common
+from config import Config
+from model import Model
+
+'''
+Benchmarks of the preprocessing, the reader, training, evaluation and prediction, on a synthetic dataset
+with the debug config. Run from the repository root:
+    python3 -m benchmarks.run_benchmarks --output results.json [--baseline baseline.json]
+Every benchmark runs a warm-up first, and reports the median of --repeats measurements.
+'''
+
+
+def count_lines(path):
+    with open(path, 'rb') as file:
+        return sum(1 for _ in file)
+
+
+def median_of(repeats, measure):
+    measure()  # warm-up
+    return float(np.median([measure() for _ in range(repeats)]))
+
+
+def reset_graph(seed):
+    tf.reset_default_graph()
+    tf.set_random_seed(seed)
+    # the reader caches the lookup tables of the current graph
+    reader.Reader.class_subtoken_table = None
+    reader.Reader.class_target_table = None
+    reader.Reader.class_node_table = None
+
+
+def make_config(data_path=None, test_path=None, save_path=None, load_path=None):
+    args = Namespace(data_path=data_path, test_path=test_path, save_path_prefix=save_path, load_path=load_path,
+                     release=False, num_eval_workers=1, ps_hosts=None, worker_hosts=None, task_index=0,
+                     telemetry_path=None, profile_path=None)
+    return Config.get_debug_config(args)
+
+
+def benchmark_preprocessing(raw_paths, dataset_name, max_contexts, max_data_contexts, repeats):
+    num_bytes = sum(os.path.getsize(path) for path in raw_paths.values())
+
+    def measure():
+        start_time = time.perf_counter()
+        for role, raw_path in raw_paths.items():
+            preprocess.process_file(file_path=raw_path, data_file_role=role, dataset_name=dataset_name,
+                                    max_contexts=max_contexts, max_data_contexts=max_data_contexts)
+        return num_bytes / (1024 * 1024) / (time.perf_counter() - start_time)
+
+    return median_of(repeats, measure)
+
+
+def benchmark_reader(config, is_evaluating, num_examples, repeats, seed):
+    reset_graph(seed)
+    model = Model(config)
+    data_reader = reader.Reader(subtoken_to_index=model.subtoken_to_index, node_to_index=model.node_to_index,
+                                target_to_index=model.target_to_index, config=config, is_evaluating=is_evaluating)
+    batch_size_op = tf.shape(data_reader.get_output()[reader.TARGET_INDEX_KEY])[0]
+    model.sess.run(tf.tables_initializer())
+
+    def measure():
+        examples = 0
+        start_time = time.perf_counter()
+        while examples < num_examples:
+            data_reader.reset(model.sess)
+            try:
+                while examples < num_examples:
+                    examples += model.sess.run(batch_size_op)
+            except tf.errors.OutOfRangeError:
+                pass
+        return examples / (time.perf_counter() - start_time)
+
+    result = median_of(repeats, measure)
+    model.close_session()
+    return result
+
+
+def benchmark_training(config, num_steps, repeats, seed, save_path):
+    # Returns the training steps/sec, and the path of a checkpoint for the evaluation and prediction benchmarks
+    reset_graph(seed)
+    model = Model(config)
+    train_reader = reader.Reader(subtoken_to_index=model.subtoken_to_index, node_to_index=model.node_to_index,
+                                 target_to_index=model.target_to_index, config=config)
+    optimizer, train_loss = model.build_training_graph(train_reader.get_output())
+    model.initialize_session_variables(model.sess)
+    train_reader.reset(model.sess)
+
+    def measure():
+        start_time = time.perf_counter()
+        for _ in range(num_steps):
+            try:
+                model.sess.run([optimizer, train_loss])
+            except tf.errors.OutOfRangeError:
+                train_reader.reset(model.sess)
+        return num_steps / (time.perf_counter() - start_time)
+
+    result = median_of(repeats, measure)
+    checkpoint_path = model.save_model(model.sess, save_path)
+    model.checkpoint_writer.close()
+    model.close_session()
+    return result, checkpoint_path
+
+
+def benchmark_evaluation(config, repeats, seed):
+    reset_graph(seed)
+    model = Model(config)
+    num_examples = count_lines(config.TEST_PATH)
+
+    def measure():
+        start_time = time.perf_counter()
+        model.evaluate()
+        return num_examples / (time.perf_counter() - start_time)
+
+    result = median_of(repeats, measure)
+    model.close_session()
+    return result
+
+
+def benchmark_prediction(config, lines, repeats, seed):
+    # Returns the latency (in milliseconds) of predicting a single example, and per example in a call with all the lines
+    reset_graph(seed)
+    model = Model(config)
+    model.predict(lines[:1])  # builds the graph and loads the model
+
+    def measure_single():
+        start_time = time.perf_counter()
+        model.predict(lines[:1])
+        return 1000 * (time.perf_counter() - start_time)
+
+    def measure_batch():
+        start_time = time.perf_counter()
+        model.predict(lines)
+        return 1000 * (time.perf_counter() - start_time) / len(lines)
+
+    results = median_of(repeats, measure_single), median_of(repeats, measure_batch)
+    model.close_session()
+    return results
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    # Prints the change of every benchmark relative to the baseline, returns the names of the regressed benchmarks
+    regressions = []
+    print('%-32s %14s %14s %9s' % ('benchmark', 'baseline', 'current', 'change'))
+    for name, result in results['benchmarks'].items():
+        if name not in baseline['benchmarks']:
+            print('%-32s %14s %14.3f %9s' % (name, '-', result['value'], 'new'))
+            continue
+        baseline_value = baseline['benchmarks'][name]['value']
+        change = (result['value'] - baseline_value) / baseline_value if baseline_value else 0
+        regressed = -change > tolerance if result['higher_is_better'] else change > tolerance
+        if regressed:
+            regressions.append(name)
+        print('%-32s %14.3f %14.3f %+8.1f%%%s' % (name, baseline_value, result['value'], 100 * change,
+                                                   '  REGRESSION' if regressed else ''))
+    return regressions
+
+
+def run_benchmarks(args):
+    random.seed(args.seed)
+    np.random.seed(args.seed)
+    benchmarks = {}
+
+    def add_result(name, value, unit, higher_is_better=True):
+        benchmarks[name] = {'value': value, 'unit': unit, 'higher_is_better': higher_is_better}
+        print('%s: %.3f %s' % (name, value, unit))
+
+    work_dir = tempfile.mkdtemp(prefix='code2seq_benchmarks_')
+    try:
+        dataset_name = os.path.join(work_dir, 'synthetic')
+        params = synthetic_dataset.default_params(max_contexts=args.max_data_contexts,
+                                                  mean_contexts=args.max_data_contexts // 2)
+        params['subtoken_vocab']['size'] = 5000
+        params['target_vocab']['size'] = 1000
+        params['node_vocab']['size'] = 50
+        synthetic_dataset.generate_dataset(params, dataset_name, args.num_train_examples, args.num_eval_examples,
+                                           args.num_eval_examples, seed=args.seed)
+        raw_paths = {role: '%s.%s.raw.txt' % (dataset_name, role) for role in ['test', 'val', 'train']}
+        target_histogram, subtoken_histogram, node_histogram = [
+            '%s.histo.%s.c2s' % (dataset_name, suffix) for suffix in ['tgt', 'ori', 'node']]
+
+        add_result('preprocess_mb_per_sec',
+                   benchmark_preprocessing(raw_paths, dataset_name, args.max_contexts, args.max_data_contexts,
+                                           args.repeats), 'MB/s')
+        preprocess.save_dictionaries(dataset_name=dataset_name,
+                                     subtoken_to_count=Common.load_histogram(subtoken_histogram),
+                                     node_to_count=Common.load_histogram(node_histogram),
+                                     target_to_count=Common.load_histogram(target_histogram),
+                                     max_contexts=args.max_data_contexts, num_examples=args.num_train_examples)
+        test_path = dataset_name + '.test.c2s'
+
+        save_path = os.path.join(work_dir, 'model', 'model')
+        train_config = make_config(data_path=dataset_name, test_path=test_path, save_path=save_path)
+        add_result('reader_train_examples_per_sec',
+                   benchmark_reader(train_config, is_evaluating=False, num_examples=args.num_train_examples,
+                                    repeats=args.repeats, seed=args.seed), 'examples/s')
+        add_result('reader_eval_examples_per_sec',
+                   benchmark_reader(train_config, is_evaluating=True, num_examples=args.num_eval_examples,
+                                    repeats=args.repeats, seed=args.seed), 'examples/s')
+        train_steps_per_sec, checkpoint_path = benchmark_training(
+            train_config, args.train_steps, args.repeats, args.seed, save_path=save_path)
+        add_result('train_steps_per_sec', train_steps_per_sec, 'steps/s')
+
+        eval_config = make_config(test_path=test_path, load_path=checkpoint_path)
+        for name, beam_width in [('greedy', 0), ('beam', args.beam_width)]:
+            config = copy.deepcopy(eval_config)
+            config.BEAM_WIDTH = beam_width
+            add_result('eval_%s_examples_per_sec' % name, benchmark_evaluation(config, args.repeats, args.seed),
+                       'examples/s')
+
+        with open(test_path, 'r') as file:
+            predict_lines = [line.rstrip('\n') for _, line in zip(range(args.predict_batch_size), file)]
+        single_latency, batch_latency = benchmark_prediction(eval_config, predict_lines, args.repeats, args.seed)
+        add_result('predict_single_latency_ms', single_latency, 'ms', higher_is_better=False)
+        add_result('predict_batch_latency_per_example_ms', batch_latency, 'ms', higher_is_better=False)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        'environment': {'python': platform.python_version(), 'tensorflow': tf.__version__,
+                        'platform': platform.platform(), 'cpu_count': multiprocessing.cpu_count()},
+        'parameters': vars(args),
+        'benchmarks': benchmarks,
+    }
+
+
+def parse_args(argv=None):
+    parser = ArgumentParser()
+    parser.add_argument('--output', help='path of the JSON file to write the results to', metavar='FILE')
+    parser.add_argument('--baseline', help='path of the JSON results of a previous run to compare to', metavar='FILE')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='relative change from the baseline that is reported as a regression')
+    parser.add_argument('--seed', type=int, default=239)
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--num_train_examples', type=int, default=2000)
+    parser.add_argument('--num_eval_examples', type=int, default=500)
+    parser.add_argument('--max_contexts', type=int, default=5)
+    parser.add_argument('--max_data_contexts', type=int, default=20)
+    parser.add_argument('--train_steps', type=int, default=50)
+    parser.add_argument('--beam_width', type=int, default=4)
+    parser.add_argument('--predict_batch_size', type=int, default=32)
+    return parser.parse_args(argv)
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    results = run_benchmarks(args)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print('Results saved to: %s' % args.output)
+    if args.baseline:
+        with open(args.baseline, 'r') as file:
+            regressions = compare_to_baseline(results, json.load(file), args.tolerance)
+        if regressions:
+            print('Regressions: %s' % ', '.join(regressions))
+            sys.exit(1)
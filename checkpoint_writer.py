@@ -0,0 +1,85 @@
+import queue
+import threading
+
+import tensorflow as tf
+
+# The state file of the latest checkpoints, so that the 'checkpoint' file keeps listing the other checkpoints
+LATEST_CHECKPOINT_STATE = 'checkpoint_latest'
+
+
+class CheckpointWriter:
+    # Writes checkpoints on a background thread, so that training does not wait for the disk.
+    # The training thread only copies the variable values to host memory (save() returns right after);
+    # a separate graph, holding a variable per saved variable, feeds these values to its own Saver.
+    # The written checkpoints have the same variable names as the ones written by a Saver of the training graph.
+    # The latest checkpoints (saved with latest=True) go through a Saver of their own, which keeps only the most
+    # recent one, so that they do not take the places of the other checkpoints in max_to_keep.
+
+    def __init__(self, variables, max_to_keep=10):
+        self.variables = variables
+        self.graph = tf.Graph()
+        with self.graph.as_default(), tf.device('/cpu:0'):
+            self.placeholders = []
+            assign_ops = []
+            var_list = {}
+            for variable in variables:
+                placeholder = tf.placeholder(variable.dtype.base_dtype, shape=variable.get_shape())
+                writer_variable = tf.Variable(tf.zeros(variable.get_shape(), dtype=variable.dtype.base_dtype),
+                                              trainable=False)
+                assign_ops.append(tf.assign(writer_variable, placeholder))
+                self.placeholders.append(placeholder)
+                var_list[variable.op.name] = writer_variable
+            self.assign_op = tf.group(*assign_ops)
+            self.saver = tf.train.Saver(var_list=var_list, max_to_keep=max_to_keep)
+            self.latest_saver = tf.train.Saver(var_list=var_list, max_to_keep=1)
+            self.sess = tf.Session(graph=self.graph)
+            self.sess.run(tf.variables_initializer(list(var_list.values())))
+
+        self.jobs = queue.Queue()
+        self.error = None
+        self.thread = threading.Thread(target=self.write_checkpoints, daemon=True)
+        self.thread.start()
+
+    def save(self, sess, save_target, after_save=None, latest=False):
+        # after_save, if given, is called with save_target on the writer thread once the checkpoint is fully written
+        self.raise_if_failed()
+        values = sess.run(self.variables)
+        self.jobs.put((values, save_target, after_save, latest))
+
+    def write_checkpoints(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                self.jobs.task_done()
+                break
+            values, save_target, after_save, latest = job
+            try:
+                if self.error is None:
+                    self.sess.run(self.assign_op, feed_dict=dict(zip(self.placeholders, values)))
+                    if latest:
+                        self.latest_saver.save(self.sess, save_target, latest_filename=LATEST_CHECKPOINT_STATE,
+                                               write_meta_graph=False)
+                    else:
+                        self.saver.save(self.sess, save_target, write_meta_graph=False)
+                    if after_save is not None:
+                        after_save(save_target)
+            except Exception as e:
+                self.error = e
+            finally:
+                self.jobs.task_done()
+
+    def wait(self):
+        # Blocks until all the checkpoints that were passed to save() are written
+        self.jobs.join()
+        self.raise_if_failed()
+
+    def raise_if_failed(self):
+        if self.error is not None:
+            raise RuntimeError('Writing a checkpoint failed') from self.error
+
+    def close(self):
+        if self.thread.is_alive():
+            self.jobs.put(None)
+            self.thread.join()
+        self.sess.close()
+        self.raise_if_failed()
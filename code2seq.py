@@ -1,7 +1,9 @@
+import sys
 from argparse import ArgumentParser
 import numpy as np
 import tensorflow as tf
 
+import distributed
 from config import Config
 from interactive_predict import InteractivePredictor
 from model import Model
@@ -20,6 +22,20 @@ if __name__ == '__main__':
     parser.add_argument('--release', action='store_true',
                         help='if specified and loading a trained model, release the loaded model for a smaller model '
                              'size.')
+    parser.add_argument('--eval_workers', dest='num_eval_workers', type=int, default=1,
+                        help='when evaluating a loaded model, split the test file into this number of shards '
+                             'and evaluate them in parallel processes')
+    parser.add_argument('--ps_hosts', help='distributed training: comma-separated host:port of parameter servers')
+    parser.add_argument('--worker_hosts', help='distributed training: comma-separated host:port of workers')
+    parser.add_argument('--job_name', choices=['ps', 'worker'], default='worker',
+                        help='distributed training: the job of this process')
+    parser.add_argument('--task_index', type=int, default=0,
+                        help='distributed training: the index of this process in its job. Worker 0 is the chief')
+    parser.add_argument('--telemetry', dest='telemetry_path', metavar='FILE',
+                        help='path prefix of the telemetry files (FILE.jsonl and the Prometheus textfile FILE.prom)')
+    parser.add_argument('--profile', dest='profile_path', metavar='DIR',
+                        help='trace a window of training, evaluation and prediction steps, and write the timelines '
+                             'and the time per op type to DIR')
     parser.add_argument('--predict', action='store_true')
     parser.add_argument('--debug', action='store_true')
     parser.add_argument('--seed', type=int, default=239)
@@ -33,6 +49,10 @@ if __name__ == '__main__':
     else:
         config = Config.get_default_config(args)
 
+    if args.job_name == 'ps':
+        distributed.run_parameter_server(config)
+        sys.exit(0)
+
     model = Model(config)
     print('Created model')
     if config.TRAIN_PATH:
@@ -1,3 +1,4 @@
+import random
 import re
 import subprocess
 import sys
@@ -46,6 +47,25 @@ class Common:
             current_index += 1
         return word_to_index, index_to_word, current_index
 
+    @staticmethod
+    def sample_lines(input_path, output_path, num_lines, seed):
+        # Writes a uniform random sample (reservoir sampling) of num_lines lines of the input file,
+        # in their original order. The same seed always selects the same lines.
+        rand = random.Random(seed)
+        reservoir = []
+        with open(input_path, 'r') as file:
+            for i, line in enumerate(file):
+                if i < num_lines:
+                    reservoir.append((i, line))
+                else:
+                    replaced = rand.randint(0, i)
+                    if replaced < num_lines:
+                        reservoir[replaced] = (i, line)
+        with open(output_path, 'w') as file:
+            for _, line in sorted(reservoir):
+                file.write(line)
+        return len(reservoir)
+
     @staticmethod
     def binary_to_string(binary_string):
         return binary_string.decode("utf-8")
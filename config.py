@@ -5,7 +5,14 @@ class Config:
         config.NUM_EPOCHS = 3000
         config.SAVE_EVERY_EPOCHS = 1
         config.PATIENCE = 10
+        config.SAVE_EVERY_MINUTES = 0
+        config.ASYNC_EVALUATION = False
+        config.VALIDATION_SUBSAMPLE_SIZE = 0
+        config.FULL_EVALUATION_EVERY_EPOCHS = 10
+        config.PROFILE_SKIP_STEPS = 10
+        config.PROFILE_STEPS = 5
         config.BATCH_SIZE = 512
+        config.GRADIENT_ACCUMULATION_STEPS = 1
         config.TEST_BATCH_SIZE = 256
         config.READER_NUM_PARALLEL_BATCHES = 1
         config.SHUFFLE_BUFFER_SIZE = 10000
@@ -25,6 +32,7 @@ class Config:
         config.BIRNN = True
         config.RANDOM_CONTEXTS = True
         config.BEAM_WIDTH = 0
+        config.EARLY_EXIT_DECODING = False
         config.USE_MOMENTUM = True
         return config
 
@@ -41,7 +49,14 @@ class Config:
         self.NUM_EPOCHS = 0
         self.SAVE_EVERY_EPOCHS = 0
         self.PATIENCE = 0
+        self.SAVE_EVERY_MINUTES = 0
+        self.ASYNC_EVALUATION = False
+        self.VALIDATION_SUBSAMPLE_SIZE = 0
+        self.FULL_EVALUATION_EVERY_EPOCHS = 0
+        self.PROFILE_SKIP_STEPS = 0
+        self.PROFILE_STEPS = 0
         self.BATCH_SIZE = 0
+        self.GRADIENT_ACCUMULATION_STEPS = 1
         self.TEST_BATCH_SIZE = 0
         self.READER_NUM_PARALLEL_BATCHES = 0
         self.SHUFFLE_BUFFER_SIZE = 0
@@ -66,8 +81,15 @@ class Config:
         self.BIRNN = False
         self.RANDOM_CONTEXTS = True
         self.BEAM_WIDTH = 1
+        self.EARLY_EXIT_DECODING = False
         self.USE_MOMENTUM = True
         self.RELEASE = args.release
+        self.NUM_EVAL_WORKERS = args.num_eval_workers
+        self.PS_HOSTS = args.ps_hosts.split(',') if args.ps_hosts else []
+        self.WORKER_HOSTS = args.worker_hosts.split(',') if args.worker_hosts else []
+        self.TASK_INDEX = args.task_index
+        self.TELEMETRY_PATH = args.telemetry_path
+        self.PROFILE_PATH = args.profile_path
 
     @staticmethod
     def get_debug_config(args):
@@ -75,7 +97,14 @@ class Config:
         config.NUM_EPOCHS = 3000
         config.SAVE_EVERY_EPOCHS = 100
         config.PATIENCE = 200
+        config.SAVE_EVERY_MINUTES = 0
+        config.ASYNC_EVALUATION = False
+        config.VALIDATION_SUBSAMPLE_SIZE = 0
+        config.FULL_EVALUATION_EVERY_EPOCHS = 100
+        config.PROFILE_SKIP_STEPS = 1
+        config.PROFILE_STEPS = 2
         config.BATCH_SIZE = 7
+        config.GRADIENT_ACCUMULATION_STEPS = 1
         config.TEST_BATCH_SIZE = 7
         config.READER_NUM_PARALLEL_BATCHES = 1
         config.SHUFFLE_BUFFER_SIZE = 10
@@ -95,5 +124,6 @@ class Config:
         config.BIRNN = True
         config.RANDOM_CONTEXTS = True
         config.BEAM_WIDTH = 0
+        config.EARLY_EXIT_DECODING = False
         config.USE_MOMENTUM = False
         return config
@@ -0,0 +1,37 @@
+import time
+
+import tensorflow as tf
+
+
+# Data-parallel training with parameter servers (between-graph replication):
+# the variables live on the parameter servers, and every worker trains its own copy of the graph
+# on a disjoint shard of the training data, updating the variables asynchronously.
+# Worker 0 (the chief) initializes the variables, evaluates, saves the model and decides when to stop.
+
+def get_cluster(config):
+    return tf.train.ClusterSpec({'ps': config.PS_HOSTS, 'worker': config.WORKER_HOSTS})
+
+
+def run_parameter_server(config):
+    server = tf.train.Server(get_cluster(config), job_name='ps', task_index=config.TASK_INDEX)
+    print('Parameter server %d started at %s' % (config.TASK_INDEX, config.PS_HOSTS[config.TASK_INDEX]))
+    server.join()
+
+
+def start_worker_server(config):
+    server = tf.train.Server(get_cluster(config), job_name='worker', task_index=config.TASK_INDEX)
+    print('Worker %d started at %s' % (config.TASK_INDEX, config.WORKER_HOSTS[config.TASK_INDEX]))
+    return server
+
+
+def get_worker_device_setter(config):
+    return tf.train.replica_device_setter(worker_device='/job:worker/task:%d' % config.TASK_INDEX,
+                                          cluster=get_cluster(config))
+
+
+def wait_for_variables_initialization(sess, shared_local_variables=(), poll_interval_seconds=5):
+    # shared_local_variables: variables that are not saved (so not global), but are initialized by the chief worker
+    uninitialized_variables = tf.report_uninitialized_variables(tf.global_variables() + list(shared_local_variables))
+    while len(sess.run(uninitialized_variables)) > 0:
+        print('Waiting for the chief worker to initialize the variables')
+        time.sleep(poll_interval_seconds)
@@ -0,0 +1,284 @@
+from collections import Counter
+
+import numpy as np
+from rouge import Rouge
+from rouge.rouge_score import f_r_p_rouge_n
+
+from common import Common
+
+
+class TargetIndexer:
+    # Maps the original target names (strings delimited by Common.internal_delimiter) to rows of target indices.
+    # Unlike the reader's target indices, names are neither truncated to MAX_TARGET_PARTS nor mapped to UNK:
+    # every out-of-vocabulary subtoken gets its own index, beyond the target vocabulary,
+    # so that comparing indices gives exactly the same answers as comparing the strings.
+    no_subtoken = -1
+
+    def __init__(self, target_to_index, index_to_target):
+        self.target_to_index = dict(target_to_index)
+        self.index_to_target = dict(index_to_target)
+        self.next_oov_index = max(index_to_target) + 1
+        for impossible_name in [Common.UNK, Common.PAD, Common.EOS]:
+            self.get_index(impossible_name)
+        self.impossible_indices = np.array(
+            [self.target_to_index[name] for name in [Common.UNK, Common.PAD, Common.EOS]], dtype=np.int64)
+        self.vocab_size = max(target_to_index.values()) + 1
+        self.vocab_lengths = np.array([len(index_to_target.get(i, '')) for i in range(self.vocab_size)],
+                                      dtype=np.int64)
+        # name -> (indices, length of the concatenated legal subtokens, concatenated legal subtokens)
+        self.names_cache = {}
+        self.plain_words_cache = {}
+
+    def get_index(self, subtoken):
+        index = self.target_to_index.get(subtoken)
+        if index is None:
+            index = self.next_oov_index
+            self.next_oov_index += 1
+            self.target_to_index[subtoken] = index
+            self.index_to_target[index] = subtoken
+        return index
+
+    def index_name(self, name):
+        indexed = self.names_cache.get(name)
+        if indexed is None:
+            subtokens = name.split(Common.internal_delimiter)
+            joined = ''.join(Common.filter_impossible_names(subtokens))
+            indexed = ([self.get_index(subtoken) for subtoken in subtokens], len(joined), joined)
+            self.names_cache[name] = indexed
+        return indexed
+
+    def index_names(self, names):
+        # Returns: indices (batch, max_parts) padded with no_subtoken, legal subtokens lengths (batch, )
+        indexed = [self.index_name(name) for name in names]
+        max_parts = max(len(indices) for indices, _, _ in indexed)
+        indices_matrix = np.full([len(names), max_parts], self.no_subtoken, dtype=np.int64)
+        for i, (indices, _, _) in enumerate(indexed):
+            indices_matrix[i, :len(indices)] = indices
+        lengths = np.array([length for _, length, _ in indexed], dtype=np.int64)
+        return indices_matrix, lengths
+
+    def legal_mask(self, indices):
+        return (indices >= 0) & ~np.isin(indices, self.impossible_indices)
+
+    def is_plain_word(self, index):
+        # A non-empty subtoken without whitespace and periods, which ROUGE treats as a single word
+        plain = self.plain_words_cache.get(index)
+        if plain is None:
+            word = self.index_to_target[index]
+            plain = word.split() == [word] and '.' not in word
+            self.plain_words_cache[index] = plain
+        return plain
+
+    def joined_prediction(self, predicted_row, legal_row):
+        return ''.join(self.index_to_target[i] for i in predicted_row[legal_row])
+
+
+def left_align(indices, mask, width):
+    # Moves the masked-in indices of every row to its beginning, keeping their order, and pads to width
+    order = np.argsort(~mask, axis=1, kind='stable')
+    aligned = np.where(np.take_along_axis(mask, order, axis=1), np.take_along_axis(indices, order, axis=1),
+                       TargetIndexer.no_subtoken)
+    padding = width - aligned.shape[1]
+    return np.pad(aligned, [(0, 0), (0, padding)], constant_values=TargetIndexer.no_subtoken)
+
+
+def rows_equal(first, first_mask, second, second_mask):
+    width = max(first.shape[1], second.shape[1])
+    return np.all(left_align(first, first_mask, width) == left_align(second, second_mask, width), axis=1)
+
+
+class EvaluationMetrics:
+    # Accumulates the exact-match accuracy (or top-k accuracy, with beam search)
+    # and the subtoken true/false positives/negatives, on whole batches of target indices
+
+    def __init__(self, indexer, beam_width, keep_per_example=False):
+        self.indexer = indexer
+        self.beam_width = beam_width
+        self.num_correct_predictions = 0 if beam_width == 0 else np.zeros([beam_width], dtype=np.int32)
+        self.total_predictions = 0
+        self.true_positive, self.false_positive, self.false_negative = 0, 0, 0
+        # per-example (true positive, false positive, false negative) batches, for bootstrapping
+        self.per_example_statistics = [] if keep_per_example else None
+
+    def update(self, true_target_strings, predicted_indices):
+        # true_target_strings: list of names, predicted_indices: (batch, time), or (batch, time, beam) with beam search
+        true_indices, true_lengths = self.indexer.index_names(true_target_strings)
+        true_legal = self.indexer.legal_mask(true_indices)
+        predicted_indices = np.asarray(predicted_indices, dtype=np.int64)
+
+        if self.beam_width > 0:
+            # a beam is correct if its legal subtokens are exactly the (unfiltered) original name
+            beams = np.transpose(predicted_indices, [0, 2, 1])  # (batch, beam, time)
+            batch_size, beam_width, time = beams.shape
+            flat_beams = beams.reshape([batch_size * beam_width, time])
+            flat_beams_legal = self.indexer.legal_mask(flat_beams)
+            beam_correct = rows_equal(flat_beams, flat_beams_legal, np.repeat(true_indices, beam_width, axis=0),
+                                      np.repeat(true_indices != TargetIndexer.no_subtoken, beam_width, axis=0))
+            # an empty name is also matched by a beam without legal subtokens, since both are joined to ''
+            empty_name = np.repeat(np.array([name == '' for name in true_target_strings]), beam_width)
+            beam_correct |= empty_name & ~np.any(flat_beams_legal, axis=1)
+            beam_correct = beam_correct.reshape([batch_size, beam_width])
+            first_correct = np.where(np.any(beam_correct, axis=1), np.argmax(beam_correct, axis=1), beam_width)
+            self.num_correct_predictions += np.sum(first_correct[:, None] <= np.arange(beam_width)[None, :],
+                                                   axis=0).astype(np.int32)
+            predicted_indices = predicted_indices[:, :, 0]
+
+        predicted_legal = self.indexer.legal_mask(predicted_indices)
+        matches = (predicted_indices[:, :, None] == true_indices[:, None, :]) \
+                  & predicted_legal[:, :, None] & true_legal[:, None, :]  # (batch, predicted_time, true_parts)
+        predicted_in_true = np.any(matches, axis=2)
+        true_in_predicted = np.any(matches, axis=1)
+
+        same_sequence = rows_equal(predicted_indices, predicted_legal, true_indices, true_legal)
+        same_set = np.all(~predicted_legal | predicted_in_true, axis=1) & np.all(~true_legal | true_in_predicted, axis=1)
+        # Different sequences can still concatenate to the same string (e.g., "get|name" and "getname"),
+        # which requires the same total length; only these rare rows are compared as strings.
+        predicted_lengths = np.sum(np.where(predicted_legal, self.indexer.vocab_lengths[
+            np.clip(predicted_indices, 0, self.indexer.vocab_size - 1)], 0), axis=1)
+        same_string = same_sequence.copy()
+        for i in np.flatnonzero(~same_sequence & (predicted_lengths == true_lengths)):
+            same_string[i] = self.indexer.joined_prediction(predicted_indices[i], predicted_legal[i]) == \
+                             self.indexer.index_name(true_target_strings[i])[2]
+
+        if self.beam_width == 0:
+            self.num_correct_predictions += int(np.sum(same_sequence | same_set | same_string))
+        true_positive = np.where(same_string, np.sum(true_legal, axis=1),
+                                 np.sum(predicted_legal & predicted_in_true, axis=1))
+        false_positive = np.where(same_string, 0, np.sum(predicted_legal & ~predicted_in_true, axis=1))
+        false_negative = np.where(same_string, 0, np.sum(true_legal & ~true_in_predicted, axis=1))
+        self.true_positive += int(np.sum(true_positive))
+        self.false_positive += int(np.sum(false_positive))
+        self.false_negative += int(np.sum(false_negative))
+        self.total_predictions += len(true_target_strings)
+        if self.per_example_statistics is not None:
+            self.per_example_statistics.append(np.stack([true_positive, false_positive, false_negative], axis=1))
+
+    def f1_confidence_interval(self, confidence=0.95, num_resamples=1000, seed=0, resamples_per_step=100):
+        # Percentile bootstrap over the evaluated examples. Requires keep_per_example=True.
+        statistics = np.concatenate(self.per_example_statistics, axis=0)  # (examples, 3)
+        random = np.random.RandomState(seed)
+        f1_scores = []
+        for start in range(0, num_resamples, resamples_per_step):
+            resamples = random.randint(0, len(statistics), size=[min(resamples_per_step, num_resamples - start),
+                                                                   len(statistics)])
+            true_positive, false_positive, false_negative = np.moveaxis(
+                np.sum(statistics[resamples], axis=1).astype(np.float64), -1, 0)
+            precision = np.divide(true_positive, true_positive + false_positive,
+                                  out=np.zeros_like(true_positive), where=true_positive + false_positive > 0)
+            recall = np.divide(true_positive, true_positive + false_negative,
+                               out=np.zeros_like(true_positive), where=true_positive + false_negative > 0)
+            f1_scores.append(np.divide(2 * precision * recall, precision + recall,
+                                       out=np.zeros_like(precision), where=precision + recall > 0))
+        low, high = np.percentile(np.concatenate(f1_scores), [50 * (1 - confidence), 50 * (1 + confidence)])
+        return low, high
+
+    def merge(self, other):
+        self.num_correct_predictions += other.num_correct_predictions
+        self.total_predictions += other.total_predictions
+        self.true_positive += other.true_positive
+        self.false_positive += other.false_positive
+        self.false_negative += other.false_negative
+        if self.per_example_statistics is not None:
+            self.per_example_statistics.extend(other.per_example_statistics)
+
+    def __getstate__(self):
+        # the indexer is not needed for merging, and is expensive to send between processes
+        state = dict(self.__dict__)
+        state['indexer'] = None
+        return state
+
+
+class RougeAccumulator:
+    # Accumulates the same averaged ROUGE-1/2/L scores that rouge.FilesRouge(avg=True, ignore_empty=True) computes
+    # on the written pred.txt and ref.txt files, batch by batch and on target indices.
+    # Names that contain subtokens that ROUGE would split or drop (empty, whitespace or periods) are scored as strings.
+    metrics = ['rouge-1', 'rouge-2', 'rouge-l']
+    stats = ['f', 'p', 'r']
+
+    def __init__(self, indexer):
+        self.indexer = indexer
+        # the scores of every example are kept, in order, so that the averages of merged accumulators
+        # are summed in exactly the same order as a single pass over the whole file
+        self.scores = {m: {s: [] for s in self.stats} for m in self.metrics}
+        # FilesRouge raises a ValueError on a hypothesis or a reference that has no words
+        self.failed = False
+        self.string_rouge = Rouge()
+
+    def update(self, true_target_strings, predicted_indices):
+        # true_target_strings: list of names, predicted_indices: (batch, time) - the top prediction of every example
+        predicted_indices = np.asarray(predicted_indices, dtype=np.int64)
+        predicted_legal = self.indexer.legal_mask(predicted_indices)
+        for name, predicted_row, legal_row in zip(true_target_strings, predicted_indices, predicted_legal):
+            reference = self.indexer.index_name(name)[0]
+            hypothesis = predicted_row[legal_row].tolist()
+            if all(self.indexer.is_plain_word(i) for i in reference) and \
+                    all(self.indexer.is_plain_word(i) for i in hypothesis):
+                if len(hypothesis) == 0 or len(reference) == 0:
+                    continue
+                scores = self.score_indices(hypothesis, reference)
+            else:
+                hypothesis_line = ' '.join(self.indexer.index_to_target[i] for i in hypothesis)
+                reference_line = name.replace(Common.internal_delimiter, ' ')
+                if len(hypothesis_line) == 0 or len(reference_line) == 0:
+                    continue
+                try:
+                    scores = self.string_rouge.get_scores(hypothesis_line, reference_line)[0]
+                except ValueError:
+                    self.failed = True
+                    continue
+            for m in self.metrics:
+                for s in self.stats:
+                    self.scores[m][s].append(scores[m][s])
+
+    @classmethod
+    def score_indices(cls, hypothesis, reference):
+        scores = {}
+        for n, m in [(1, 'rouge-1'), (2, 'rouge-2')]:
+            hypothesis_ngrams = Counter(tuple(hypothesis[i:i + n]) for i in range(len(hypothesis) - n + 1))
+            reference_ngrams = Counter(tuple(reference[i:i + n]) for i in range(len(reference) - n + 1))
+            overlap = sum((hypothesis_ngrams & reference_ngrams).values())
+            scores[m] = f_r_p_rouge_n(sum(hypothesis_ngrams.values()), sum(reference_ngrams.values()), overlap)
+        # ROUGE-L counts the distinct words of the specific LCS that the rouge package reconstructs
+        lcs_words = set(cls.reconstruct_lcs(reference, hypothesis))
+        scores['rouge-l'] = f_r_p_rouge_n(len(set(hypothesis)), len(set(reference)), len(lcs_words))
+        return scores
+
+    @staticmethod
+    def reconstruct_lcs(x, y):
+        table = [[0] * (len(y) + 1) for _ in range(len(x) + 1)]
+        for i in range(1, len(x) + 1):
+            for j in range(1, len(y) + 1):
+                if x[i - 1] == y[j - 1]:
+                    table[i][j] = table[i - 1][j - 1] + 1
+                else:
+                    table[i][j] = max(table[i - 1][j], table[i][j - 1])
+        lcs = []
+        i, j = len(x), len(y)
+        while i > 0 and j > 0:
+            if x[i - 1] == y[j - 1]:
+                lcs.append(x[i - 1])
+                i, j = i - 1, j - 1
+            elif table[i - 1][j] > table[i][j - 1]:
+                i -= 1
+            else:
+                j -= 1
+        return lcs
+
+    def merge(self, other):
+        # other must come after self in the evaluated file
+        for m in self.metrics:
+            for s in self.stats:
+                self.scores[m][s].extend(other.scores[m][s])
+        self.failed = self.failed or other.failed
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state['indexer'] = None
+        state['string_rouge'] = None
+        return state
+
+    def get_scores(self):
+        count = len(self.scores[self.metrics[0]][self.stats[0]])
+        if self.failed or count == 0:
+            return 0
+        return {m: {s: sum(self.scores[m][s]) / count for s in self.stats} for m in self.metrics}
@@ -1,25 +1,45 @@
 import _pickle as pickle
+import contextlib
 import os
+import queue
+import threading
 import time
 
 import numpy as np
-import shutil
 import tensorflow as tf
 
+import distributed
 import reader
+from async_evaluator import AsyncEvaluator
+from checkpoint_writer import CheckpointWriter, LATEST_CHECKPOINT_STATE
 from common import Common
-from rouge import FilesRouge
+from metrics import TargetIndexer, EvaluationMetrics, RougeAccumulator
+from profiler import Profiler
+from sharded_evaluation import evaluate_in_shards
+from telemetry import Telemetry, parse_buffer_utilization
 
 
 class Model:
     topk = 10
     num_batches_to_log = 100
-
-    def __init__(self, config):
+    num_batches_to_prefetch_in_evaluation = 10
+    subsample_seed = 239
+    shuffle_seed = 239
+    # saved with every checkpoint, to resume training
+    training_state_attributes = ['batch_num', 'iteration_batches', 'best_f1', 'best_epoch', 'best_f1_precision',
+                                 'best_f1_recall', 'best_checkpoint', 'best_subsample_f1', 'epochs_no_improve',
+                                 'epochs_since_full_evaluation']
+
+    def __init__(self, config, session_config=None):
         self.config = config
-        self.sess = tf.Session()
+        if config.WORKER_HOSTS:
+            self.server = distributed.start_worker_server(config)
+            self.sess = tf.Session(self.server.target, config=session_config)
+        else:
+            self.sess = tf.Session(config=session_config)
 
         self.eval_queue = None
+        self.subsample_queue = None
         self.predict_queue = None
 
         self.eval_placeholder = None
@@ -27,6 +47,32 @@ class Model:
         self.eval_predicted_indices_op, self.eval_top_values_op, self.eval_true_target_strings_op, self.eval_topk_values = None, None, None, None
         self.predict_top_indices_op, self.predict_top_scores_op, self.predict_target_strings_op = None, None, None
         self.subtoken_to_index = None
+        self.target_indexer = None
+        self.vocab_path = None
+        self.checkpoint_writer = None
+        # the training state (see training_state_attributes), restored from self.training_state when resuming
+        self.batch_num = 0
+        # the number of batches of the current iteration that were already trained on
+        self.iteration_batches = 0
+        self.best_f1 = 0
+        self.best_epoch = 0
+        self.best_f1_precision = 0
+        self.best_f1_recall = 0
+        self.best_checkpoint = None
+        self.best_subsample_f1 = 0
+        self.epochs_no_improve = 0
+        self.epochs_since_full_evaluation = 0
+        self.training_state = None
+        self.latest_checkpoint = None
+        self.profiler = None
+        if config.PROFILE_PATH:
+            self.profiler = Profiler(config.PROFILE_PATH if not config.WORKER_HOSTS
+                                     else os.path.join(config.PROFILE_PATH, 'worker%d' % config.TASK_INDEX),
+                                     skip_steps=config.PROFILE_SKIP_STEPS, num_steps=config.PROFILE_STEPS)
+        self.telemetry = None
+        if config.TELEMETRY_PATH:
+            self.telemetry = Telemetry(config.TELEMETRY_PATH if not config.WORKER_HOSTS
+                                       else '%s.worker%d' % (config.TELEMETRY_PATH, config.TASK_INDEX))
 
         if config.LOAD_PATH:
             self.load_model(sess=None)
@@ -63,78 +109,295 @@ class Model:
         print('Starting training')
         start_time = time.time()
 
-        batch_num = 0
         sum_loss = 0
-        best_f1 = 0
-        best_epoch = 0
-        best_f1_precision = 0
-        best_f1_recall = 0
-        epochs_no_improve = 0
-
-        self.queue_thread = reader.Reader(subtoken_to_index=self.subtoken_to_index,
-                                          node_to_index=self.node_to_index,
-                                          target_to_index=self.target_to_index,
-                                          config=self.config)
-        optimizer, train_loss = self.build_training_graph(self.queue_thread.get_output())
+        if self.training_state is not None:
+            # resuming from a checkpoint: continue from the same position in the training data
+            for name in self.training_state_attributes:
+                # checkpoints of older versions may lack some of the attributes, which keep their initial values
+                setattr(self, name, self.training_state.get(name, getattr(self, name)))
+
+        # in distributed training, the variables are placed on the parameter servers
+        with tf.device(distributed.get_worker_device_setter(self.config) if self.config.WORKER_HOSTS else None):
+            self.queue_thread = reader.Reader(subtoken_to_index=self.subtoken_to_index,
+                                              node_to_index=self.node_to_index,
+                                              target_to_index=self.target_to_index,
+                                              config=self.config, collect_stats=self.telemetry is not None)
+            input_tensors = self.queue_thread.get_output()
+            stage_input_op = None
+            if self.telemetry is not None:
+                stage_input_op, input_tensors = self.stage_training_input(input_tensors)
+            optimizer, train_loss = self.build_training_graph(input_tensors)
+        if self.telemetry is not None:
+            buffer_utilization_op = self.queue_thread.stats_aggregator.get_summary()
+            self.previous_buffer_utilization = (0, 0)
         self.print_hyperparams()
         print('Number of trainable params:',
               np.sum([np.prod(v.get_shape().as_list()) for v in tf.trainable_variables()]))
-        self.initialize_session_variables(self.sess)
-        print('Initalized variables')
-        if self.config.LOAD_PATH:
-            self.load_model(self.sess)
+        if self.is_chief_worker():
+            self.initialize_session_variables(self.sess)
+            print('Initalized variables')
+            if self.config.LOAD_PATH:
+                self.load_model(self.sess)
+        else:
+            distributed.wait_for_variables_initialization(self.sess, shared_local_variables=[self.stop_training_flag])
+            # the stop flag is shared by all the workers and initialized by the chief worker only: a worker that
+            # starts (or restarts) after the chief worker set it must not reset it
+            worker_local_variables = [variable for variable in tf.local_variables()
+                                      if variable is not self.stop_training_flag]
+            self.sess.run(tf.group(tf.variables_initializer(worker_local_variables), tf.tables_initializer()))
+            print('Variables were initialized by the chief worker')
+
+        async_evaluator = AsyncEvaluator(self.config) \
+            if self.config.ASYNC_EVALUATION and self.is_chief_worker() else None
 
         time.sleep(1)
         print('Started reader...')
 
         multi_batch_start_time = time.time()
-        for iteration in range(1, (self.config.NUM_EPOCHS // self.config.SAVE_EVERY_EPOCHS) + 1):
-            self.queue_thread.reset(self.sess)
+        last_save_time = time.time()
+        if self.telemetry is not None:
+            self.telemetry.start_window('train')
+        first_iteration = self.epochs_trained // self.config.SAVE_EVERY_EPOCHS + 1
+        for iteration in range(first_iteration, (self.config.NUM_EPOCHS // self.config.SAVE_EVERY_EPOCHS) + 1):
+            if self.iteration_batches > 0:
+                print('Resuming training after %d batches of iteration %d' % (self.iteration_batches, iteration))
+            self.queue_thread.reset(self.sess, shuffle_seed=self.shuffle_seed + iteration,
+                                    num_examples_to_skip=self.iteration_batches * self.config.BATCH_SIZE)
             try:
                 while True:
-                    batch_num += 1
-                    _, batch_loss = self.sess.run([optimizer, train_loss])
+                    self.batch_num += 1
+                    if stage_input_op is not None:
+                        with self.telemetry.timer('train', 'input_wait'):
+                            self.sess.run(stage_input_op)
+                    with self.telemetry_timer('train', 'compute'):
+                        _, batch_loss = self.run_session('train', [optimizer, train_loss])
+                        if self.config.GRADIENT_ACCUMULATION_STEPS > 1 \
+                                and self.batch_num % self.config.GRADIENT_ACCUMULATION_STEPS == 0:
+                            self.sess.run(self.apply_accumulated_gradients_op)
+                    self.iteration_batches += 1
                     sum_loss += batch_loss
                     # print('SINGLE BATCH LOSS', batch_loss)
-                    if batch_num % self.num_batches_to_log == 0:
-                        self.trace(sum_loss, batch_num, multi_batch_start_time)
+                    # the accumulated gradients are not saved, so checkpoints are taken between updates
+                    if self.config.SAVE_EVERY_MINUTES > 0 and self.is_chief_worker() \
+                            and time.time() - last_save_time >= self.config.SAVE_EVERY_MINUTES * 60 \
+                            and self.batch_num % self.config.GRADIENT_ACCUMULATION_STEPS == 0:
+                        self.save_latest_checkpoint()
+                        last_save_time = time.time()
+                    if self.batch_num % self.num_batches_to_log == 0:
+                        self.trace(sum_loss, self.batch_num, multi_batch_start_time)
+                        if self.telemetry is not None:
+                            self.record_training_window(sum_loss, buffer_utilization_op)
                         sum_loss = 0
                         multi_batch_start_time = time.time()
+                        if not self.is_chief_worker() and self.sess.run(self.stop_training_flag):
+                            print('The chief worker finished training')
+                            return
 
 
             except tf.errors.OutOfRangeError:
                 self.epochs_trained += self.config.SAVE_EVERY_EPOCHS
+                self.iteration_batches = 0
                 print('Finished %d epochs' % self.config.SAVE_EVERY_EPOCHS)
-                results, precision, recall, f1, rouge = self.evaluate()
-                if self.config.BEAM_WIDTH == 0:
-                    print('Accuracy after %d epochs: %.5f' % (self.epochs_trained, results))
-                else:
-                    print('Accuracy after {} epochs: {}'.format(self.epochs_trained, results))
-                print('After %d epochs: Precision: %.5f, recall: %.5f, F1: %.5f' % (
-                    self.epochs_trained, precision, recall, f1))
-                print('Rouge: ', rouge)
-                if f1 > best_f1:
-                    best_f1 = f1
-                    best_f1_precision = precision
-                    best_f1_recall = recall
-                    best_epoch = self.epochs_trained
-                    epochs_no_improve = 0
-                    self.save_model(self.sess, self.config.SAVE_PATH)
+                if not self.is_chief_worker():
+                    # only the chief worker evaluates and saves
+                    continue
+                use_subsample = self.config.VALIDATION_SUBSAMPLE_SIZE > 0
+                stop_training = False
+                full_evaluation = True
+                if use_subsample:
+                    # early stopping is decided on the subsample, the full validation set is evaluated only
+                    # when the subsample improves, or FULL_EVALUATION_EVERY_EPOCHS after the last full evaluation
+                    with self.telemetry_timer('train', 'evaluation'):
+                        improved, stop_training = self.evaluate_subsample()
+                    self.epochs_since_full_evaluation += self.config.SAVE_EVERY_EPOCHS
+                    full_evaluation = improved \
+                        or self.epochs_since_full_evaluation >= self.config.FULL_EVALUATION_EVERY_EPOCHS
+                if full_evaluation:
+                    self.epochs_since_full_evaluation = 0
+                if full_evaluation and async_evaluator is not None:
+                    # the checkpoint is submitted for evaluation by the checkpoint writer, once it is fully written
+                    self.save_model(self.sess, self.config.SAVE_PATH,
+                                    after_save=lambda checkpoint_path, epochs=self.epochs_trained:
+                                    async_evaluator.submit(epochs, checkpoint_path))
+                    evaluations = async_evaluator.get_finished_results()
+                elif async_evaluator is not None:
+                    evaluations = async_evaluator.get_finished_results()
+                elif full_evaluation:
+                    with self.telemetry_timer('train', 'evaluation'):
+                        evaluations = [(self.epochs_trained, None, self.evaluate())]
                 else:
-                    epochs_no_improve += self.config.SAVE_EVERY_EPOCHS
-                    if epochs_no_improve >= self.config.PATIENCE:
-                        print('Not improved for %d epochs, stopping training' % self.config.PATIENCE)
-                        print('Best scores - epoch %d: ' % best_epoch)
-                        print('Precision: %.5f, recall: %.5f, F1: %.5f' % (best_f1_precision, best_f1_recall, best_f1))
-                        return
+                    evaluations = []
+                if self.report_evaluations(evaluations, early_stopping=not use_subsample) or stop_training:
+                    self.stop_other_workers()
+                    self.checkpoint_writer.close()
+                    if async_evaluator is not None:
+                        async_evaluator.close()
+                    return
+
+        if not self.is_chief_worker():
+            return
+        self.stop_other_workers()
+        if async_evaluator is not None:
+            self.checkpoint_writer.wait()
+            self.report_evaluations(async_evaluator.get_finished_results(wait_for_all=True),
+                                    early_stopping=self.config.VALIDATION_SUBSAMPLE_SIZE == 0)
+            async_evaluator.close()
+            print('Best scores - epoch %d (%s): ' % (self.best_epoch, self.best_checkpoint))
+            print('Precision: %.5f, recall: %.5f, F1: %.5f' % (self.best_f1_precision, self.best_f1_recall, self.best_f1))
 
         if self.config.SAVE_PATH:
             self.save_model(self.sess, self.config.SAVE_PATH + '.final')
             print('Model saved in file: %s' % self.config.SAVE_PATH)
+        self.checkpoint_writer.close()
 
         elapsed = int(time.time() - start_time)
         print("Training time: %sh%sm%ss\n" % ((elapsed // 60 // 60), (elapsed // 60) % 60, elapsed % 60))
 
+    def stage_training_input(self, input_tensors):
+        # The training graph reads its input from a staging area that is filled by a separate session call,
+        # so that the time blocked on the reader is measured apart from the time of the training step
+        names = sorted(input_tensors.keys())
+        with tf.device('/cpu:0'):
+            staging_area = tf.contrib.staging.StagingArea(dtypes=[input_tensors[name].dtype for name in names],
+                                                          shapes=[input_tensors[name].get_shape() for name in names],
+                                                          names=names)
+            stage_op = staging_area.put(input_tensors)
+            staged_tensors = staging_area.get()
+        return stage_op, staged_tensors
+
+    def record_training_window(self, sum_loss, buffer_utilization_op):
+        # the utilization histogram is cumulative, the mean utilization of the window is computed from the differences
+        mean_buffer_utilization = None
+        buffer_utilization = parse_buffer_utilization(self.sess.run(buffer_utilization_op))
+        if buffer_utilization is not None:
+            previous_sum, previous_count = self.previous_buffer_utilization
+            utilization_sum, count = buffer_utilization
+            if count > previous_count:
+                mean_buffer_utilization = (utilization_sum - previous_sum) / (count - previous_count)
+            self.previous_buffer_utilization = buffer_utilization
+        self.telemetry.end_window('train', batch_num=self.batch_num, epochs_trained=self.epochs_trained,
+                                  examples=self.config.BATCH_SIZE * self.num_batches_to_log,
+                                  avg_loss=sum_loss / self.num_batches_to_log,
+                                  prefetch_buffer_utilization=mean_buffer_utilization)
+
+    def run_session(self, phase, fetches, feed_dict=None):
+        if self.profiler is None:
+            return self.sess.run(fetches, feed_dict=feed_dict)
+        return self.profiler.run(self.sess, phase, fetches, feed_dict=feed_dict)
+
+    def telemetry_timer(self, window, name):
+        if self.telemetry is None or window is None:
+            return contextlib.nullcontext()
+        return self.telemetry.timer(window, name)
+
+    def save_latest_checkpoint(self):
+        # Saves the current training position, to resume from if training is interrupted.
+        # Only the most recent of these checkpoints is kept: they are saved by their own Saver (max_to_keep=1),
+        # which deletes the variables of the previous one; its .dict file is deleted here.
+        previous_checkpoint = self.latest_checkpoint
+
+        def delete_previous_dictionaries(checkpoint_path):
+            if previous_checkpoint is not None and previous_checkpoint != checkpoint_path \
+                    and os.path.exists(previous_checkpoint + '.dict'):
+                os.remove(previous_checkpoint + '.dict')
+
+        self.latest_checkpoint = self.save_model(self.sess, self.config.SAVE_PATH + '_latest',
+                                                 after_save=delete_previous_dictionaries, latest=True)
+
+    def is_chief_worker(self):
+        return not self.config.WORKER_HOSTS or self.config.TASK_INDEX == 0
+
+    def stop_other_workers(self):
+        if self.config.WORKER_HOSTS:
+            self.sess.run(self.stop_training_op)
+
+    def report_evaluations(self, evaluations, early_stopping=True):
+        # evaluations: list of (epochs_trained, checkpoint_path, evaluation_results), where checkpoint_path is None
+        # if the evaluated weights are the ones currently in the session. Returns True if training should stop.
+        # If early_stopping is False, the evaluations only determine the best model.
+        for epochs_trained, checkpoint_path, (results, precision, recall, f1, rouge) in evaluations:
+            if self.config.BEAM_WIDTH == 0:
+                print('Accuracy after %d epochs: %.5f' % (epochs_trained, results))
+            else:
+                print('Accuracy after {} epochs: {}'.format(epochs_trained, results))
+            print('After %d epochs: Precision: %.5f, recall: %.5f, F1: %.5f' % (
+                epochs_trained, precision, recall, f1))
+            print('Rouge: ', rouge)
+            if f1 > self.best_f1:
+                self.best_f1 = f1
+                self.best_f1_precision = precision
+                self.best_f1_recall = recall
+                self.best_epoch = epochs_trained
+                if early_stopping:
+                    self.epochs_no_improve = 0
+                if checkpoint_path is None:
+                    self.save_model(self.sess, self.config.SAVE_PATH)
+                else:
+                    if self.best_checkpoint is not None:
+                        AsyncEvaluator.delete_checkpoint(self.best_checkpoint)
+                    self.best_checkpoint = checkpoint_path
+            else:
+                if checkpoint_path is not None:
+                    AsyncEvaluator.delete_checkpoint(checkpoint_path)
+                if not early_stopping:
+                    continue
+                self.epochs_no_improve += self.config.SAVE_EVERY_EPOCHS
+                if self.epochs_no_improve >= self.config.PATIENCE:
+                    print('Not improved for %d epochs, stopping training' % self.config.PATIENCE)
+                    print('Best scores - epoch %d: ' % self.best_epoch)
+                    print('Precision: %.5f, recall: %.5f, F1: %.5f' % (
+                        self.best_f1_precision, self.best_f1_recall, self.best_f1))
+                    return True
+        return False
+
+    def evaluate_subsample(self):
+        # Evaluates a fixed random subsample of the validation set, and updates the early stopping counters.
+        # F1 counts as improved only if the lower bound of its confidence interval is above the best F1 so far,
+        # so that the noise of the subsample does not reset the patience or trigger full evaluations.
+        # Returns (whether F1 improved on the subsample, whether training should stop)
+        subsample_dirname = os.path.join(os.path.dirname(self.config.SAVE_PATH), 'validation_subsample')
+        if self.subsample_queue is None:
+            subsample_path = os.path.join(subsample_dirname, os.path.basename(self.config.TEST_PATH))
+            if not os.path.exists(subsample_dirname):
+                os.makedirs(subsample_dirname)
+            num_examples = Common.sample_lines(self.config.TEST_PATH, subsample_path,
+                                               self.config.VALIDATION_SUBSAMPLE_SIZE, seed=self.subsample_seed)
+            print('Sampled %d validation examples to: %s' % (num_examples, subsample_path))
+            self.subsample_queue = reader.Reader(subtoken_to_index=self.subtoken_to_index,
+                                                 node_to_index=self.node_to_index,
+                                                 target_to_index=self.target_to_index,
+                                                 config=self.config, is_evaluating=True, file_path=subsample_path)
+            reader_output = self.subsample_queue.get_output()
+            self.subsample_predicted_indices_op, self.subsample_topk_values, _, _ = \
+                self.build_test_graph(reader_output)
+            self.subsample_true_target_strings_op = reader_output[reader.TARGET_STRING_KEY]
+
+        if self.telemetry is not None:
+            self.telemetry.start_window('subsample_evaluation')
+        metrics, _ = self.evaluate_accumulators(subsample_dirname, on_subsample=True)
+        precision, recall, f1 = self.calculate_results(metrics.true_positive, metrics.false_positive,
+                                                       metrics.false_negative)
+        with self.telemetry_timer('subsample_evaluation', 'confidence_interval'):
+            f1_low, f1_high = metrics.f1_confidence_interval()
+        if self.telemetry is not None:
+            self.telemetry.end_window('subsample_evaluation', examples=metrics.total_predictions,
+                                      epochs_trained=self.epochs_trained, f1=f1, f1_low=f1_low, f1_high=f1_high)
+        print('Validation subsample after %d epochs: Precision: %.5f, recall: %.5f, F1: %.5f (95%% CI: %.5f-%.5f)' % (
+            self.epochs_trained, precision, recall, f1, f1_low, f1_high))
+
+        if f1_low > self.best_subsample_f1:
+            self.best_subsample_f1 = f1
+            self.epochs_no_improve = 0
+            return True, False
+        self.epochs_no_improve += self.config.SAVE_EVERY_EPOCHS
+        if self.epochs_no_improve >= self.config.PATIENCE:
+            print('Not improved on the validation subsample for %d epochs, stopping training' % self.config.PATIENCE)
+            print('Best scores - epoch %d: ' % self.best_epoch)
+            print('Precision: %.5f, recall: %.5f, F1: %.5f' % (
+                self.best_f1_precision, self.best_f1_recall, self.best_f1))
+            return False, True
+        return False, False
+
     def trace(self, sum_loss, batch_num, multi_batch_start_time):
         multi_batch_elapsed = time.time() - multi_batch_start_time
         avg_loss = sum_loss / self.num_batches_to_log
@@ -144,6 +407,35 @@ class Model:
 
     def evaluate(self, release=False):
         eval_start_time = time.time()
+        if self.telemetry is not None:
+            self.telemetry.start_window('evaluation')
+        evaluating_saved_model = self.config.LOAD_PATH and not self.config.TRAIN_PATH
+        if release and evaluating_saved_model:
+            self.prepare_evaluation()
+            release_name = self.config.LOAD_PATH + '.release'
+            print('Releasing model, output model: %s' % release_name)
+            self.saver.save(self.sess, release_name)
+            # a released model is self-contained: its .dict file holds the vocabularies rather than a reference
+            self.write_dictionaries(release_name + '.dict')
+            return None
+        model_dirname = os.path.dirname(self.config.SAVE_PATH if self.config.SAVE_PATH else self.config.LOAD_PATH)
+        if evaluating_saved_model and self.config.NUM_EVAL_WORKERS > 1:
+            metrics, rouge = evaluate_in_shards(self.config, model_dirname)
+        else:
+            self.prepare_evaluation()
+            metrics, rouge = self.evaluate_accumulators(model_dirname)
+
+        elapsed = int(time.time() - eval_start_time)
+        precision, recall, f1 = self.calculate_results(metrics.true_positive, metrics.false_positive,
+                                                       metrics.false_negative)
+        print("Evaluation time: %sh%sm%ss" % ((elapsed // 60 // 60), (elapsed // 60) % 60, elapsed % 60))
+        if self.telemetry is not None:
+            self.telemetry.end_window('evaluation', examples=metrics.total_predictions, epochs_trained=self.epochs_trained,
+                                      precision=precision, recall=recall, f1=f1)
+        return metrics.num_correct_predictions / metrics.total_predictions, \
+               precision, recall, f1, rouge.get_scores()
+
+    def prepare_evaluation(self):
         if self.eval_queue is None:
             self.eval_queue = reader.Reader(subtoken_to_index=self.subtoken_to_index,
                                             node_to_index=self.node_to_index,
@@ -158,13 +450,10 @@ class Model:
         if self.config.LOAD_PATH and not self.config.TRAIN_PATH:
             self.initialize_session_variables(self.sess)
             self.load_model(self.sess)
-            if release:
-                release_name = self.config.LOAD_PATH + '.release'
-                print('Releasing model, output model: %s' % release_name)
-                self.saver.save(self.sess, release_name)
-                shutil.copyfile(src=self.config.LOAD_PATH + '.dict', dst=release_name + '.dict')
-                return None
-        model_dirname = os.path.dirname(self.config.SAVE_PATH if self.config.SAVE_PATH else self.config.LOAD_PATH)
+
+    def evaluate_accumulators(self, model_dirname, on_subsample=False):
+        # Evaluates config.TEST_PATH (or the validation subsample), writes the log files to model_dirname
+        # and returns the (EvaluationMetrics, RougeAccumulator) of the whole file
         ref_file_name = model_dirname + '/ref.txt'
         predicted_file_name = model_dirname + '/pred.txt'
         if not os.path.exists(model_dirname):
@@ -173,118 +462,105 @@ class Model:
         with open(model_dirname + '/log.txt', 'w') as output_file, open(ref_file_name, 'w') as ref_file, open(
                 predicted_file_name,
                 'w') as pred_file:
-            num_correct_predictions = 0 if self.config.BEAM_WIDTH == 0 \
-                else np.zeros([self.config.BEAM_WIDTH], dtype=np.int32)
-            total_predictions = 0
+            if self.target_indexer is None:
+                self.target_indexer = TargetIndexer(self.target_to_index, self.index_to_target)
+            metrics = EvaluationMetrics(self.target_indexer, self.config.BEAM_WIDTH, keep_per_example=on_subsample)
+            rouge = RougeAccumulator(self.target_indexer)
             total_prediction_batches = 0
-            true_positive, false_positive, false_negative = 0, 0, 0
-            self.eval_queue.reset(self.sess)
+            if on_subsample:
+                eval_queue = self.subsample_queue
+                fetches = [self.subsample_predicted_indices_op, self.subsample_true_target_strings_op,
+                           self.subsample_topk_values]
+            else:
+                eval_queue = self.eval_queue
+                fetches = [self.eval_predicted_indices_op, self.eval_true_target_strings_op, self.eval_topk_values]
+            eval_queue.reset(self.sess)
             start_time = time.time()
-
-            try:
-                while True:
-                    predicted_indices, true_target_strings, top_values = self.sess.run(
-                        [self.eval_predicted_indices_op, self.eval_true_target_strings_op, self.eval_topk_values],
-                    )
-                    true_target_strings = Common.binary_to_string_list(true_target_strings)
-                    ref_file.write(
-                        '\n'.join(
-                            [name.replace(Common.internal_delimiter, ' ') for name in true_target_strings]) + '\n')
-                    if self.config.BEAM_WIDTH > 0:
-                        # predicted indices: (batch, time, beam_width)
-                        predicted_strings = [[[self.index_to_target[i] for i in timestep] for timestep in example] for
-                                             example in predicted_indices]
-                        predicted_strings = [list(map(list, zip(*example))) for example in
-                                             predicted_strings]  # (batch, top-k, target_length)
-                        pred_file.write('\n'.join(
-                            [' '.join(Common.filter_impossible_names(words)) for words in predicted_strings[0]]) + '\n')
-                    else:
-                        predicted_strings = [[self.index_to_target[i] for i in example]
-                                             for example in predicted_indices]
-                        pred_file.write('\n'.join(
-                            [' '.join(Common.filter_impossible_names(words)) for words in predicted_strings]) + '\n')
-
-                    num_correct_predictions = self.update_correct_predictions(num_correct_predictions, output_file,
-                                                                              zip(true_target_strings,
-                                                                                  predicted_strings))
-                    true_positive, false_positive, false_negative = self.update_per_subtoken_statistics(
-                        zip(true_target_strings, predicted_strings),
-                        true_positive, false_positive, false_negative)
-
-                    total_predictions += len(true_target_strings)
-                    total_prediction_batches += 1
-                    if total_prediction_batches % self.num_batches_to_log == 0:
-                        elapsed = time.time() - start_time
-                        self.trace_evaluation(output_file, num_correct_predictions, total_predictions, elapsed)
-            except tf.errors.OutOfRangeError:
-                pass
+            telemetry_window = 'subsample_evaluation' if on_subsample else 'evaluation'
+
+            for predicted_indices, true_target_strings, top_values in self.run_evaluation_batches(fetches,
+                                                                                                 telemetry_window):
+                true_target_strings = Common.binary_to_string_list(true_target_strings)
+                with self.telemetry_timer(telemetry_window, 'logs'):
+                    self.write_evaluation_logs(output_file, ref_file, pred_file, true_target_strings,
+                                               predicted_indices)
+                with self.telemetry_timer(telemetry_window, 'metrics'):
+                    metrics.update(true_target_strings, predicted_indices)
+                with self.telemetry_timer(telemetry_window, 'rouge'):
+                    rouge.update(true_target_strings,
+                                 predicted_indices[:, :, 0] if self.config.BEAM_WIDTH > 0 else predicted_indices)
+
+                total_prediction_batches += 1
+                if total_prediction_batches % self.num_batches_to_log == 0:
+                    elapsed = time.time() - start_time
+                    self.trace_evaluation(output_file, metrics.num_correct_predictions, metrics.total_predictions,
+                                          elapsed)
 
             print('Done testing, epoch reached')
-            output_file.write(str(num_correct_predictions / total_predictions) + '\n')
+            output_file.write(str(metrics.num_correct_predictions / metrics.total_predictions) + '\n')
             # Common.compute_bleu(ref_file_name, predicted_file_name)
+        return metrics, rouge
 
-        elapsed = int(time.time() - eval_start_time)
-        precision, recall, f1 = self.calculate_results(true_positive, false_positive, false_negative)
-        try:
-            files_rouge = FilesRouge()
-            rouge = files_rouge.get_scores(
-                hyp_path=predicted_file_name, ref_path=ref_file_name, avg=True, ignore_empty=True)
-        except ValueError:
-            rouge = 0
-        print("Evaluation time: %sh%sm%ss" % ((elapsed // 60 // 60), (elapsed // 60) % 60, elapsed % 60))
-        return num_correct_predictions / total_predictions, \
-               precision, recall, f1, rouge
-
-    def update_correct_predictions(self, num_correct_predictions, output_file, results):
-        for original_name, predicted in results:
-            original_name_parts = original_name.split(Common.internal_delimiter) # list
-            filtered_original = Common.filter_impossible_names(original_name_parts) # list
-            predicted_first = predicted
-            if self.config.BEAM_WIDTH > 0:
-                predicted_first = predicted[0]
-            filtered_predicted_first_parts = Common.filter_impossible_names(predicted_first) # list
-
-            if self.config.BEAM_WIDTH == 0:
-                output_file.write('Original: ' + Common.internal_delimiter.join(original_name_parts) +
-                                  ' , predicted 1st: ' + Common.internal_delimiter.join(filtered_predicted_first_parts) + '\n')
-                if filtered_original == filtered_predicted_first_parts or Common.unique(filtered_original) == Common.unique(
-                        filtered_predicted_first_parts) or ''.join(filtered_original) == ''.join(filtered_predicted_first_parts):
-                    num_correct_predictions += 1
-            else:
-                filtered_predicted = [Common.internal_delimiter.join(Common.filter_impossible_names(p)) for p in predicted]
-
-                true_ref = original_name
-                output_file.write('Original: ' + ' '.join(original_name_parts) + '\n')
-                for i, p in enumerate(filtered_predicted):
-                    output_file.write('\t@{}: {}'.format(i + 1, ' '.join(p.split(Common.internal_delimiter)))+ '\n')
-                if true_ref in filtered_predicted:
-                    index_of_correct = filtered_predicted.index(true_ref)
-                    update = np.concatenate(
-                        [np.zeros(index_of_correct, dtype=np.int32),
-                         np.ones(self.config.BEAM_WIDTH - index_of_correct, dtype=np.int32)])
-                    num_correct_predictions += update
-        return num_correct_predictions
-
-    def update_per_subtoken_statistics(self, results, true_positive, false_positive, false_negative):
-        for original_name, predicted in results:
-            if self.config.BEAM_WIDTH > 0:
-                predicted = predicted[0]
-            filtered_predicted_names = Common.filter_impossible_names(predicted)
-            filtered_original_subtokens = Common.filter_impossible_names(original_name.split(Common.internal_delimiter))
+    def run_evaluation_batches(self, fetches, telemetry_window=None):
+        # Runs the evaluation graph on a separate thread, and yields the fetched batches in order.
+        # sess.run releases the GIL, so the next batches are computed while the caller post-processes the current one.
+        # The time the caller waits for the graph is recorded in the telemetry window as graph_wait.
+        batches = queue.Queue(maxsize=self.num_batches_to_prefetch_in_evaluation)
+        stopped = threading.Event()
 
-            if ''.join(filtered_original_subtokens) == ''.join(filtered_predicted_names):
-                true_positive += len(filtered_original_subtokens)
-                continue
+        def run_graph():
+            try:
+                while not stopped.is_set():
+                    batches.put(self.run_session(telemetry_window or 'evaluation', fetches))
+            except tf.errors.OutOfRangeError:
+                batches.put(None)
+            except Exception as e:
+                batches.put(e)
 
-            for subtok in filtered_predicted_names:
-                if subtok in filtered_original_subtokens:
-                    true_positive += 1
-                else:
-                    false_positive += 1
-            for subtok in filtered_original_subtokens:
-                if not subtok in filtered_predicted_names:
-                    false_negative += 1
-        return true_positive, false_positive, false_negative
+        graph_thread = threading.Thread(target=run_graph, daemon=True)
+        graph_thread.start()
+        try:
+            while True:
+                with self.telemetry_timer(telemetry_window, 'graph_wait'):
+                    batch = batches.get()
+                if batch is None:
+                    return
+                if isinstance(batch, Exception):
+                    raise batch
+                yield batch
+        finally:
+            stopped.set()
+            # drain the queue in case the graph thread is blocked on a full queue
+            while graph_thread.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    def write_evaluation_logs(self, output_file, ref_file, pred_file, true_target_strings, predicted_indices):
+        # The only place where predictions are decoded to strings, metrics are computed on the indices
+        ref_file.write(
+            '\n'.join([name.replace(Common.internal_delimiter, ' ') for name in true_target_strings]) + '\n')
+        if self.config.BEAM_WIDTH > 0:
+            # predicted indices: (batch, time, beam_width)
+            predicted_strings = [[[self.index_to_target[i] for i in timestep] for timestep in example] for
+                                 example in predicted_indices]
+            predicted_strings = [list(map(list, zip(*example))) for example in
+                                 predicted_strings]  # (batch, top-k, target_length)
+            pred_file.write('\n'.join(
+                [' '.join(Common.filter_impossible_names(example[0])) for example in predicted_strings]) + '\n')
+            for original_name, predicted in zip(true_target_strings, predicted_strings):
+                output_file.write('Original: ' + ' '.join(original_name.split(Common.internal_delimiter)) + '\n')
+                for i, p in enumerate(predicted):
+                    output_file.write('\t@{}: {}'.format(i + 1, ' '.join(Common.filter_impossible_names(p))) + '\n')
+        else:
+            predicted_strings = [[self.index_to_target[i] for i in example]
+                                 for example in predicted_indices]
+            pred_file.write('\n'.join(
+                [' '.join(Common.filter_impossible_names(words)) for words in predicted_strings]) + '\n')
+            for original_name, predicted in zip(true_target_strings, predicted_strings):
+                output_file.write('Original: ' + original_name + ' , predicted 1st: ' +
+                                  Common.internal_delimiter.join(Common.filter_impossible_names(predicted)) + '\n')
 
     def print_hyperparams(self):
         print('Training batch size:\t\t\t', self.config.BATCH_SIZE)
@@ -383,23 +659,101 @@ class Model:
                                                     maxlen=self.config.MAX_TARGET_PARTS + 1, dtype=tf.float32)
             loss = tf.reduce_sum(crossent * target_words_nonzero) / tf.to_float(batch_size)
 
+            accumulation_steps = self.config.GRADIENT_ACCUMULATION_STEPS
             if self.config.USE_MOMENTUM:
-                learning_rate = tf.train.exponential_decay(0.01, step * self.config.BATCH_SIZE,
+                # In distributed training, step is the global step shared by all the workers,
+                # so the learning rate decays once per epoch of the whole training data (global batch).
+                # With gradient accumulation, every step is an update of accumulation_steps batches.
+                learning_rate = tf.train.exponential_decay(0.01, step * self.config.BATCH_SIZE * accumulation_steps,
                                                            self.num_training_examples,
                                                            0.95, staircase=True)
                 optimizer = tf.train.MomentumOptimizer(learning_rate, 0.95, use_nesterov=True)
-                train_op = optimizer.minimize(loss, global_step=step)
+                if accumulation_steps > 1:
+                    train_op = self.build_gradient_accumulation(optimizer, loss, global_step=step)
+                else:
+                    train_op = optimizer.minimize(loss, global_step=step)
             else:
-                params = tf.trainable_variables()
-                gradients = tf.gradients(loss, params)
-                clipped_gradients, _ = tf.clip_by_global_norm(gradients, clip_norm=5)
                 optimizer = tf.train.AdamOptimizer()
-                train_op = optimizer.apply_gradients(zip(clipped_gradients, params))
+                if accumulation_steps > 1:
+                    train_op = self.build_gradient_accumulation(optimizer, loss, clip_norm=5)
+                else:
+                    params = tf.trainable_variables()
+                    gradients = tf.gradients(loss, params)
+                    clipped_gradients, _ = tf.clip_by_global_norm(gradients, clip_norm=5)
+                    train_op = optimizer.apply_gradients(zip(clipped_gradients, params))
 
             self.saver = tf.train.Saver(max_to_keep=10)
+            # the latest checkpoints (SAVE_EVERY_MINUTES) are saved apart, so that they do not count in max_to_keep
+            self.latest_saver = tf.train.Saver(max_to_keep=1)
+            if self.is_chief_worker():
+                # with asynchronous evaluation every checkpoint is saved, and the non-best ones are deleted once evaluated
+                self.checkpoint_writer = CheckpointWriter(tf.global_variables(),
+                                                          max_to_keep=None if self.config.ASYNC_EVALUATION else 10)
+            if self.config.WORKER_HOSTS:
+                # set by the chief worker when training ends. Placed on a parameter server, so it is shared by all
+                # the workers; it is in LOCAL_VARIABLES only so that it is not saved, and only the chief initializes it
+                self.stop_training_flag = tf.Variable(False, trainable=False, name='STOP_TRAINING',
+                                                      collections=[tf.GraphKeys.LOCAL_VARIABLES])
+                self.stop_training_op = tf.assign(self.stop_training_flag, True)
 
         return train_op, loss
 
+    def build_gradient_accumulation(self, optimizer, loss, global_step=None, clip_norm=None):
+        # Returns an op that adds the gradients of a (micro-)batch to accumulators, and sets
+        # self.apply_accumulated_gradients_op, which applies their average and resets them.
+        # Like without accumulation, the sparse gradients (IndexedSlices, of the embeddings) are applied sparsely:
+        # their rows and indices are accumulated by concatenation (the optimizer sums the rows of repeated indices),
+        # so only the used rows of the embeddings are updated, and parameters without a gradient are not updated.
+        # Running the first GRADIENT_ACCUMULATION_STEPS times and then the second is therefore equivalent to
+        # a single update with a GRADIENT_ACCUMULATION_STEPS times larger batch.
+        params = tf.trainable_variables()
+        gradients_and_params = [(gradient, param) for gradient, param in zip(tf.gradients(loss, params), params)
+                                if gradient is not None]
+
+        def local_variable(initial_value, validate_shape=True):
+            # The accumulators are local variables: they are not saved, and in distributed training
+            # every worker keeps its own accumulators rather than placing them on the parameter servers.
+            with tf.device(None):
+                return tf.Variable(initial_value, trainable=False, validate_shape=validate_shape,
+                                   collections=[tf.GraphKeys.LOCAL_VARIABLES])
+
+        accumulate_ops = []
+        reset_ops = []
+        averaged_gradients = []
+        for gradient, param in gradients_and_params:
+            if isinstance(gradient, tf.IndexedSlices):
+                row_shape = param.get_shape().as_list()[1:]
+                empty_indices = tf.zeros([0], dtype=gradient.indices.dtype)
+                empty_values = tf.zeros([0] + row_shape, dtype=gradient.values.dtype)
+                # the number of accumulated rows grows with every micro-batch
+                indices_accumulator = local_variable(empty_indices, validate_shape=False)
+                values_accumulator = local_variable(empty_values, validate_shape=False)
+                accumulate_ops.append(tf.assign(indices_accumulator,
+                                                tf.concat([indices_accumulator, gradient.indices], 0),
+                                                validate_shape=False))
+                accumulate_ops.append(tf.assign(values_accumulator,
+                                                tf.concat([values_accumulator, gradient.values], 0),
+                                                validate_shape=False))
+                reset_ops.append(tf.assign(indices_accumulator, empty_indices, validate_shape=False))
+                reset_ops.append(tf.assign(values_accumulator, empty_values, validate_shape=False))
+                averaged_gradients.append(tf.IndexedSlices(
+                    values=tf.reshape(values_accumulator, [-1] + row_shape) / self.config.GRADIENT_ACCUMULATION_STEPS,
+                    indices=tf.reshape(indices_accumulator, [-1]),
+                    dense_shape=tf.shape(param, out_type=gradient.indices.dtype)))
+            else:
+                accumulator = local_variable(tf.zeros(param.get_shape(), dtype=param.dtype.base_dtype))
+                accumulate_ops.append(tf.assign_add(accumulator, gradient))
+                reset_ops.append(tf.assign(accumulator, tf.zeros_like(accumulator)))
+                averaged_gradients.append(accumulator / self.config.GRADIENT_ACCUMULATION_STEPS)
+
+        if clip_norm is not None:
+            averaged_gradients, _ = tf.clip_by_global_norm(averaged_gradients, clip_norm=clip_norm)
+        apply_op = optimizer.apply_gradients(zip(averaged_gradients, [param for _, param in gradients_and_params]),
+                                             global_step=global_step)
+        with tf.control_dependencies([apply_op]):
+            self.apply_accumulated_gradients_op = tf.group(*reset_ops)
+        return tf.group(*accumulate_ops)
+
     def decode_outputs(self, target_words_vocab, target_input, batch_size, batched_contexts, valid_mask,
                        is_evaluating=False):
         num_contexts_per_example = tf.count_nonzero(valid_mask, axis=-1)
@@ -423,6 +777,11 @@ class Model:
             num_units=self.config.DECODER_SIZE,
             memory=batched_contexts
         )
+        if is_evaluating and self.config.BEAM_WIDTH == 0 and self.config.EARLY_EXIT_DECODING:
+            return self.greedy_decode_early_exit(decoder_cell=decoder_cell, attention_mechanism=attention_mechanism,
+                                                 projection_layer=projection_layer,
+                                                 target_words_vocab=target_words_vocab, start_fill=start_fill,
+                                                 initial_cell_state=fake_encoder_state, batch_size=batch_size)
         # TF doesn't support beam search with alignment history
         should_save_alignment_history = is_evaluating and self.config.BEAM_WIDTH == 0
         decoder_cell = tf.contrib.seq2seq.AttentionWrapper(decoder_cell, attention_mechanism,
@@ -467,6 +826,74 @@ class Model:
                                                                                           maximum_iterations=self.config.MAX_TARGET_PARTS + 1)
         return outputs, final_states
 
+    def greedy_decode_early_exit(self, decoder_cell, attention_mechanism, projection_layer, target_words_vocab,
+                                 start_fill, initial_cell_state, batch_size):
+        # Greedy decoding that stops as soon as all examples emitted PAD, and runs the decoder cell, the attention
+        # and the projection only on the examples that did not finish yet. The computation is the same as
+        # AttentionWrapper + GreedyEmbeddingHelper, and the variables are created in the same scopes, so trained
+        # models can be loaded as is. Finished examples emit PAD in all later steps.
+        end_token = self.target_to_index[Common.PAD]
+        keys = attention_mechanism.keys  # (batch, max_contexts, decoder_size)
+        values = attention_mechanism.values  # (batch, max_contexts, decoder_size)
+        max_contexts = tf.shape(values)[1]
+        attention_layer = tf.layers.Dense(self.config.DECODER_SIZE, use_bias=False, name='attention_layer')
+
+        def scatter_active(active_rows, active_values, full_tensor):
+            scattered = tf.scatter_nd(tf.expand_dims(active_rows, -1), active_values, tf.shape(full_tensor))
+            scattered.set_shape(full_tensor.shape)
+            return scattered
+
+        def condition(time, finished, *_):
+            return tf.logical_and(time < self.config.MAX_TARGET_PARTS + 1, tf.logical_not(tf.reduce_all(finished)))
+
+        def body(time, finished, inputs, cell_state, attention, alignments, sample_ids_array, alignments_array):
+            active_rows = tf.to_int32(tf.reshape(tf.where(tf.logical_not(finished)), [-1]))  # (active, )
+            active_cell_state = tf.contrib.framework.nest.map_structure(lambda t: tf.gather(t, active_rows),
+                                                                        cell_state)
+            cell_inputs = tf.concat([tf.gather(inputs, active_rows), tf.gather(attention, active_rows)], axis=-1)
+            with tf.variable_scope('decoder/attention_wrapper'):
+                cell_output, next_active_cell_state = decoder_cell(cell_inputs, active_cell_state)
+                scores = tf.squeeze(tf.matmul(tf.expand_dims(cell_output, 1), tf.gather(keys, active_rows),
+                                              transpose_b=True), [1])  # (active, max_contexts)
+                active_alignments = tf.nn.softmax(scores)
+                context = tf.squeeze(tf.matmul(tf.expand_dims(active_alignments, 1), tf.gather(values, active_rows)),
+                                     [1])  # (active, decoder_size)
+                next_active_attention = attention_layer(tf.concat([cell_output, context], axis=-1))
+            with tf.variable_scope('decoder'):
+                logits = projection_layer(next_active_attention)  # (active, target_vocab_size)
+            active_sample_ids = tf.argmax(logits, axis=-1, output_type=tf.int32)
+
+            sample_ids = tf.where(finished, tf.fill([batch_size], end_token),
+                                  tf.scatter_nd(tf.expand_dims(active_rows, -1), active_sample_ids, [batch_size]))
+            next_finished = tf.logical_or(finished, tf.equal(sample_ids, end_token))
+            next_inputs = tf.nn.embedding_lookup(target_words_vocab, sample_ids)
+            next_cell_state = tf.contrib.framework.nest.map_structure(
+                lambda active, full: scatter_active(active_rows, active, full), next_active_cell_state, cell_state)
+            next_attention = scatter_active(active_rows, next_active_attention, attention)
+            next_alignments = scatter_active(active_rows, active_alignments, alignments)
+            return time + 1, next_finished, next_inputs, next_cell_state, next_attention, next_alignments, \
+                   sample_ids_array.write(time, sample_ids), alignments_array.write(time, next_alignments)
+
+        initial_loop_vars = [
+            tf.constant(0, dtype=tf.int32),
+            tf.zeros([batch_size], dtype=tf.bool),
+            tf.nn.embedding_lookup(target_words_vocab, start_fill),
+            initial_cell_state,
+            tf.zeros([batch_size, self.config.DECODER_SIZE], dtype=tf.float32),
+            tf.zeros([batch_size, max_contexts], dtype=tf.float32),
+            tf.TensorArray(dtype=tf.int32, size=0, dynamic_size=True),
+            tf.TensorArray(dtype=tf.float32, size=0, dynamic_size=True)]
+        final_time, _, _, final_cell_state, final_attention, final_alignments, sample_ids_array, alignments_array = \
+            tf.while_loop(condition, body, loop_vars=initial_loop_vars)
+
+        # The logits of the decoded steps are not kept, only the predicted ids
+        outputs = tf.contrib.seq2seq.BasicDecoderOutput(
+            rnn_output=None, sample_id=tf.transpose(sample_ids_array.stack(), [1, 0]))  # (batch, time)
+        final_states = tf.contrib.seq2seq.AttentionWrapperState(
+            cell_state=final_cell_state, attention=final_attention, time=final_time, alignments=final_alignments,
+            alignment_history=alignments_array, attention_state=final_alignments)
+        return outputs, final_states
+
     def calculate_path_abstraction(self, path_embed, path_lengths, valid_contexts_mask, is_evaluating=False):
         return self.path_rnn_last_state(is_evaluating, path_embed, path_lengths, valid_contexts_mask)
 
@@ -611,7 +1038,8 @@ class Model:
 
         results = []
         for line in predict_data_lines:
-            predicted_indices, top_scores, true_target_strings, attention_weights, path_source_string, path_strings, path_target_string = self.sess.run(
+            predicted_indices, top_scores, true_target_strings, attention_weights, path_source_string, path_strings, path_target_string = self.run_session(
+                'predict',
                 [self.predict_top_indices_op, self.predict_top_scores_op, self.predict_target_strings_op,
                  self.attention_weights_op,
                  self.predict_source_string, self.predict_path_string, self.predict_path_target_string],
@@ -654,31 +1082,80 @@ class Model:
             results.append(attention_per_context)
         return results
 
-    def save_model(self, sess, path):
+    def save_model(self, sess, path, after_save=None, latest=False):
+        save_start_time = time.time()
         save_target = path + '_iter%d' % self.epochs_trained
         dirname = os.path.dirname(save_target)
         if not os.path.exists(dirname):
             os.makedirs(dirname)
-        self.saver.save(sess, save_target)
 
-        dictionaries_path = save_target + '.dict'
+        # The vocabularies do not change during training, they are written once, to <save_prefix>.vocab, and
+        # referenced by every checkpoint. The save prefix is SAVE_PATH, or, when the model is saved without
+        # SAVE_PATH, the path of the first save (without the suffix of the latest checkpoints)
+        if self.vocab_path is None:
+            save_prefix = self.config.SAVE_PATH
+            if save_prefix is None:
+                save_prefix = path[:-len('_latest')] if path.endswith('_latest') else path
+            self.vocab_path = save_prefix + '.vocab'
+            with open(self.vocab_path, 'wb') as file:
+                self.write_vocabs(file)
+
+        self.write_dictionaries(save_target + '.dict', vocab_path=self.vocab_path)
+
+        if self.checkpoint_writer is not None:
+            self.checkpoint_writer.save(sess, save_target, after_save=after_save, latest=latest)
+        elif latest:
+            self.latest_saver.save(sess, save_target, latest_filename=LATEST_CHECKPOINT_STATE)
+        else:
+            self.saver.save(sess, save_target)
+            if after_save is not None:
+                after_save(save_target)
+        print('Saved after %d epochs in: %s' % (self.epochs_trained, save_target))
+        if self.telemetry is not None:
+            # the time training was paused for; with the checkpoint writer, the checkpoint is written in the background
+            save_seconds = time.time() - save_start_time
+            self.telemetry.add_time('train', 'checkpoint', save_seconds)
+            self.telemetry.record('checkpoint', seconds=save_seconds, epochs_trained=self.epochs_trained)
+        return save_target
+
+    def write_dictionaries(self, dictionaries_path, vocab_path=None):
+        # Writes the .dict file of a checkpoint: a reference to vocab_path (relative to the checkpoint), or the
+        # vocabularies themselves if vocab_path is None, followed by the training state
         with open(dictionaries_path, 'wb') as file:
-            pickle.dump(self.subtoken_to_index, file)
-            pickle.dump(self.index_to_subtoken, file)
-            pickle.dump(self.subtoken_vocab_size, file)
-
-            pickle.dump(self.target_to_index, file)
-            pickle.dump(self.index_to_target, file)
-            pickle.dump(self.target_vocab_size, file)
-
-            pickle.dump(self.node_to_index, file)
-            pickle.dump(self.index_to_node, file)
-            pickle.dump(self.nodes_vocab_size, file)
-
+            if vocab_path is None:
+                self.write_vocabs(file)
+            else:
+                pickle.dump(os.path.relpath(vocab_path, os.path.dirname(dictionaries_path)), file)
             pickle.dump(self.num_training_examples, file)
             pickle.dump(self.epochs_trained, file)
             pickle.dump(self.config, file)
-        print('Saved after %d epochs in: %s' % (self.epochs_trained, save_target))
+            pickle.dump({name: getattr(self, name) for name in self.training_state_attributes}, file)
+
+    def write_vocabs(self, file):
+        pickle.dump(self.subtoken_to_index, file)
+        pickle.dump(self.index_to_subtoken, file)
+        pickle.dump(self.subtoken_vocab_size, file)
+
+        pickle.dump(self.target_to_index, file)
+        pickle.dump(self.index_to_target, file)
+        pickle.dump(self.target_vocab_size, file)
+
+        pickle.dump(self.node_to_index, file)
+        pickle.dump(self.index_to_node, file)
+        pickle.dump(self.nodes_vocab_size, file)
+
+    def read_vocabs(self, file, subtoken_to_index):
+        self.subtoken_to_index = subtoken_to_index
+        self.index_to_subtoken = pickle.load(file)
+        self.subtoken_vocab_size = pickle.load(file)
+
+        self.target_to_index = pickle.load(file)
+        self.index_to_target = pickle.load(file)
+        self.target_vocab_size = pickle.load(file)
+
+        self.node_to_index = pickle.load(file)
+        self.index_to_node = pickle.load(file)
+        self.nodes_vocab_size = pickle.load(file)
 
     def load_model(self, sess):
         if not sess is None:
@@ -688,22 +1165,24 @@ class Model:
             if self.subtoken_to_index is not None:
                 return
             print('Loading dictionaries from: ' + self.config.LOAD_PATH)
-            self.subtoken_to_index = pickle.load(file)
-            self.index_to_subtoken = pickle.load(file)
-            self.subtoken_vocab_size = pickle.load(file)
-
-            self.target_to_index = pickle.load(file)
-            self.index_to_target = pickle.load(file)
-            self.target_vocab_size = pickle.load(file)
-
-            self.node_to_index = pickle.load(file)
-            self.index_to_node = pickle.load(file)
-            self.nodes_vocab_size = pickle.load(file)
+            vocab_path_or_subtoken_to_index = pickle.load(file)
+            if isinstance(vocab_path_or_subtoken_to_index, str):
+                vocab_path = os.path.join(os.path.dirname(self.config.LOAD_PATH), vocab_path_or_subtoken_to_index)
+                with open(vocab_path, 'rb') as vocab_file:
+                    self.read_vocabs(vocab_file, pickle.load(vocab_file))
+            else:
+                # older models store the vocabularies in the .dict file of every checkpoint
+                self.read_vocabs(file, vocab_path_or_subtoken_to_index)
 
             self.num_training_examples = pickle.load(file)
             self.epochs_trained = pickle.load(file)
             saved_config = pickle.load(file)
             self.config.take_model_hyperparams_from(saved_config)
+            try:
+                self.training_state = pickle.load(file)
+            except EOFError:
+                # older models do not store the training state
+                self.training_state = None
             print('Done loading dictionaries')
 
     @staticmethod
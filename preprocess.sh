@@ -14,6 +14,9 @@
 # for the test and validation sets only MAX_CONTEXTS contexts are kept 
 # (while for training, MAX_DATA_CONTEXTS are kept and MAX_CONTEXTS are
 # selected dynamically during training).
+# To limit the size of the raw files and the extraction time of very large
+#   methods, the extractor can uniformly sample the contexts of every method:
+#   add e.g. "--max_contexts 30000" to the JavaExtractor/extract.py commands below.
 # SUBTOKEN_VOCAB_SIZE, TARGET_VOCAB_SIZE -   
 #   - the number of subtokens and target words to keep 
 #   in the vocabulary (the top occurring words and paths will be kept). 
@@ -0,0 +1,87 @@
+import collections
+import os
+import re
+import threading
+
+import tensorflow as tf
+from tensorflow.python.client import timeline
+
+
+class Profiler:
+    # Runs a window of the session runs of every phase (e.g., 'train', 'evaluation', 'predict') with full tracing:
+    # the first skip_steps runs of a phase are not traced (warm-up), and the next num_steps runs are.
+    # For every traced run, a Chrome trace is written to <output_dirname>/<phase>_step<N>.json (open in chrome://tracing),
+    # and the table of the total time per op type over the traced runs of a phase to <output_dirname>/<phase>_op_types.txt.
+    # Ops that run inside tf.data functions (e.g., the string processing of the reader) are not part of the traces,
+    # their time appears as the time of the iterator's IteratorGetNext op.
+
+    def __init__(self, output_dirname, skip_steps, num_steps):
+        self.output_dirname = output_dirname
+        if not os.path.exists(output_dirname):
+            os.makedirs(output_dirname)
+        self.skip_steps = skip_steps
+        self.num_steps = num_steps
+        self.steps = collections.Counter()
+        self.traced_steps = collections.Counter()
+        # phase -> (device, op type) -> [total microseconds, number of executions]
+        self.op_type_costs = collections.defaultdict(lambda: collections.defaultdict(lambda: [0, 0]))
+        # the evaluation graph runs on a separate thread
+        self.lock = threading.Lock()
+
+    def run(self, sess, phase, fetches, feed_dict=None):
+        with self.lock:
+            self.steps[phase] += 1
+            step = self.steps[phase]
+        if not self.skip_steps < step <= self.skip_steps + self.num_steps:
+            return sess.run(fetches, feed_dict=feed_dict)
+
+        run_metadata = tf.RunMetadata()
+        results = sess.run(fetches, feed_dict=feed_dict,
+                           options=tf.RunOptions(trace_level=tf.RunOptions.FULL_TRACE), run_metadata=run_metadata)
+        trace_path = os.path.join(self.output_dirname, '%s_step%d.json' % (phase, step))
+        with open(trace_path, 'w') as file:
+            file.write(timeline.Timeline(run_metadata.step_stats).generate_chrome_trace_format())
+        with self.lock:
+            self.add_op_type_costs(sess.graph, phase, run_metadata.step_stats)
+            self.traced_steps[phase] += 1
+            self.write_op_type_table(phase)
+        print('Profiled %s step %d: %s' % (phase, step, trace_path))
+        return results
+
+    def add_op_type_costs(self, graph, phase, step_stats):
+        for device_stats in step_stats.dev_stats:
+            # on GPUs, the kernels of all streams are also reported per stream
+            if '/stream:' in device_stats.device and not device_stats.device.endswith('/stream:all'):
+                continue
+            for node_stats in device_stats.node_stats:
+                op_type = self.get_op_type(graph, node_stats)
+                cost = self.op_type_costs[phase][(device_stats.device, op_type)]
+                cost[0] += node_stats.all_end_rel_micros
+                cost[1] += 1
+
+    @staticmethod
+    def get_op_type(graph, node_stats):
+        try:
+            return graph.get_operation_by_name(node_stats.node_name.split(':')[0]).type
+        except (KeyError, ValueError):
+            # e.g., kernels of GPU streams, and internal nodes such as _SOURCE. Their label is "name = OpType(inputs)"
+            match = re.search(r'= (\w+)\(', node_stats.timeline_label)
+            return match.group(1) if match else node_stats.node_name
+
+    def write_op_type_table(self, phase):
+        costs = self.op_type_costs[phase]
+        device_totals = collections.Counter()
+        for (device, _), (micros, _) in costs.items():
+            device_totals[device] += micros
+        num_steps = self.traced_steps[phase]
+        with open(os.path.join(self.output_dirname, '%s_op_types.txt' % phase), 'w') as file:
+            file.write('%s: %d traced steps\n' % (phase, num_steps))
+            for device in sorted(device_totals):
+                file.write('\n%s\n' % device)
+                file.write('%-40s %12s %12s %8s %10s\n' % ('op type', 'total ms', 'ms/step', '%', 'count'))
+                device_costs = [(op_type, micros, count) for (op_device, op_type), (micros, count) in costs.items()
+                                if op_device == device]
+                for op_type, micros, count in sorted(device_costs, key=lambda cost: -cost[1]):
+                    file.write('%-40s %12.2f %12.2f %8.2f %10d\n' % (
+                        op_type, micros / 1000, micros / 1000 / num_steps,
+                        100 * micros / device_totals[device] if device_totals[device] > 0 else 0, count))
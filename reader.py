@@ -24,9 +24,14 @@ class Reader:
     class_target_table = None
     class_node_table = None
 
-    def __init__(self, subtoken_to_index, target_to_index, node_to_index, config, is_evaluating=False):
+    def __init__(self, subtoken_to_index, target_to_index, node_to_index, config, is_evaluating=False, file_path=None,
+                 collect_stats=False):
         self.config = config
-        self.file_path = config.TEST_PATH if is_evaluating else (config.TRAIN_PATH + '.train.c2s')
+        self.collect_stats = collect_stats
+        if file_path is not None:
+            self.file_path = file_path
+        else:
+            self.file_path = config.TEST_PATH if is_evaluating else (config.TRAIN_PATH + '.train.c2s')
         if self.file_path is not None and not os.path.exists(self.file_path):
             print(
                 '%s cannot find file: %s' % ('Evaluation reader' if is_evaluating else 'Train reader', self.file_path))
@@ -169,8 +174,12 @@ class Reader:
                 PATH_STRINGS_KEY: path_strings, PATH_TARGET_STRINGS_KEY: path_target_strings
                 }
 
-    def reset(self, sess):
-        sess.run(self.reset_op)
+    def reset(self, sess, shuffle_seed=0, num_examples_to_skip=0):
+        if self.is_evaluating:
+            sess.run(self.reset_op)
+        else:
+            sess.run(self.reset_op, feed_dict={self.shuffle_seed: shuffle_seed,
+                                               self.num_examples_to_skip: num_examples_to_skip})
 
     def get_output(self):
         return self.output_tensors
@@ -180,13 +189,28 @@ class Reader:
                                                   use_quote_delim=False, buffer_size=self.config.CSV_BUFFER_SIZE)
 
         if not self.is_evaluating:
+            # The training data order is determined by the shuffle seed, so that training can be resumed
+            # in the middle of an iteration by skipping the examples that were already trained on
+            self.shuffle_seed = tf.placeholder_with_default(tf.constant(0, dtype=tf.int64), shape=[])
+            self.num_examples_to_skip = tf.placeholder_with_default(tf.constant(0, dtype=tf.int64), shape=[])
+            if len(self.config.WORKER_HOSTS) > 1:
+                # in distributed training, every worker reads a disjoint shard of the training data
+                dataset = dataset.shard(len(self.config.WORKER_HOSTS), self.config.TASK_INDEX)
             if self.config.SAVE_EVERY_EPOCHS > 1:
                 dataset = dataset.repeat(self.config.SAVE_EVERY_EPOCHS)
-            dataset = dataset.shuffle(self.config.SHUFFLE_BUFFER_SIZE, reshuffle_each_iteration=True)
+            dataset = dataset.shuffle(self.config.SHUFFLE_BUFFER_SIZE, seed=self.shuffle_seed,
+                                      reshuffle_each_iteration=True)
+            dataset = dataset.skip(self.num_examples_to_skip)
         dataset = dataset.apply(tf.data.experimental.map_and_batch(
             map_func=self.process_dataset, batch_size=self.batch_size,
             num_parallel_batches=self.config.READER_NUM_PARALLEL_BATCHES))
         dataset = dataset.prefetch(tf.contrib.data.AUTOTUNE)
+        if self.collect_stats:
+            # records the utilization of the prefetch buffer, which is reported by the training telemetry
+            self.stats_aggregator = tf.data.experimental.StatsAggregator()
+            options = tf.data.Options()
+            options.experimental_stats.aggregator = self.stats_aggregator
+            dataset = dataset.with_options(options)
         self.iterator = dataset.make_initializable_iterator()
         self.reset_op = self.iterator.initializer
         return self.iterator.get_next()
@@ -216,6 +240,8 @@ if __name__ == '__main__':
             self.MAX_TARGET_PARTS = 4
             self.RANDOM_CONTEXTS = True
             self.CSV_BUFFER_SIZE = None
+            self.WORKER_HOSTS = []
+            self.TASK_INDEX = 0
 
 
     config = Config()
@@ -0,0 +1,75 @@
+import copy
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+
+def split_to_shards(file_path, num_shards, shards_dirname):
+    # Splits the file into contiguous shards of (almost) equal number of lines, keeping the original order
+    with open(file_path, 'rb') as file:
+        num_lines = sum(1 for _ in file)
+    num_shards = max(1, min(num_shards, num_lines))
+    shard_paths = []
+    with open(file_path, 'rb') as file:
+        for shard in range(num_shards):
+            shard_size = num_lines // num_shards + (1 if shard < num_lines % num_shards else 0)
+            shard_path = os.path.join(shards_dirname, 'shard%d' % shard, os.path.basename(file_path))
+            os.makedirs(os.path.dirname(shard_path))
+            with open(shard_path, 'wb') as shard_file:
+                for _ in range(shard_size):
+                    shard_file.write(next(file))
+            shard_paths.append(shard_path)
+    return shard_paths
+
+
+def evaluate_shard(config, intra_op_threads):
+    # Runs in a worker process: loads the checkpoint once and evaluates a single shard
+    import tensorflow as tf
+    from model import Model
+
+    model = Model(config, session_config=tf.ConfigProto(intra_op_parallelism_threads=intra_op_threads,
+                                                        inter_op_parallelism_threads=intra_op_threads))
+    model.prepare_evaluation()
+    accumulators = model.evaluate_accumulators(os.path.dirname(config.TEST_PATH))
+    model.close_session()
+    return accumulators
+
+
+def evaluate_in_shards(config, output_dirname):
+    # Evaluates config.TEST_PATH in config.NUM_EVAL_WORKERS processes, each on a contiguous shard of the file.
+    # Returns the merged (EvaluationMetrics, RougeAccumulator), and writes the concatenated log files of the shards.
+    if not os.path.exists(output_dirname):
+        os.makedirs(output_dirname)
+    shards_dirname = tempfile.mkdtemp(prefix='eval_shards_', dir=output_dirname)
+    try:
+        shard_configs = []
+        for shard_path in split_to_shards(config.TEST_PATH, config.NUM_EVAL_WORKERS, shards_dirname):
+            shard_config = copy.deepcopy(config)
+            shard_config.TEST_PATH = shard_path
+            # the evaluation is recorded as a whole by the calling process
+            shard_config.TELEMETRY_PATH = None
+            if config.PROFILE_PATH:
+                shard_config.PROFILE_PATH = os.path.join(config.PROFILE_PATH, 'shard%d' % len(shard_configs))
+            shard_configs.append(shard_config)
+        num_shards = len(shard_configs)
+        intra_op_threads = max(1, multiprocessing.cpu_count() // num_shards)
+        print('Evaluating %s in %d shards' % (config.TEST_PATH, num_shards))
+        # TensorFlow is not fork-safe, the workers start fresh interpreters
+        with multiprocessing.get_context('spawn').Pool(num_shards) as pool:
+            shard_results = pool.starmap(evaluate_shard,
+                                         [(shard_config, intra_op_threads) for shard_config in shard_configs])
+
+        metrics, rouge = shard_results[0]
+        for shard_metrics, shard_rouge in shard_results[1:]:
+            metrics.merge(shard_metrics)
+            rouge.merge(shard_rouge)
+
+        for log_name in ['log.txt', 'ref.txt', 'pred.txt']:
+            with open(os.path.join(output_dirname, log_name), 'wb') as log_file:
+                for shard_config in shard_configs:
+                    with open(os.path.join(os.path.dirname(shard_config.TEST_PATH), log_name), 'rb') as shard_log:
+                        shutil.copyfileobj(shard_log, log_file)
+    finally:
+        shutil.rmtree(shards_dirname, ignore_errors=True)
+    return metrics, rouge
@@ -0,0 +1,249 @@
+import json
+from argparse import ArgumentParser
+
+import numpy as np
+
+'''
+This script generates a synthetic dataset in the format of the extractors' output ("raw" files), and the histograms
+that preprocess.sh creates from the training data, for load testing of preprocess.py, the reader and the model
+without real code. For a dataset with the prefix OUTPUT_NAME, it writes:
+  OUTPUT_NAME.train.raw.txt, OUTPUT_NAME.val.raw.txt, OUTPUT_NAME.test.raw.txt,
+  OUTPUT_NAME.histo.tgt.c2s, OUTPUT_NAME.histo.ori.c2s, OUTPUT_NAME.histo.node.c2s
+which are then passed to preprocess.py, like in preprocess.sh.
+
+The distributions of the number of contexts per example, the path lengths (number of nodes), the number of subtokens
+per token and per target name, and the (Zipf) distributions of the subtoken, node and target vocabularies
+are either configured, or fitted from an existing raw file (--fit). The fitted parameters can be saved (--save_params)
+and reused (--params) without the original data. The output is written in chunks, so the size of the dataset is
+not limited by the memory, and the same seed generates the same dataset.
+'''
+
+CHUNK_SIZE = 1000
+
+
+def discrete_distribution(values, weights):
+    weights = np.array(weights, dtype=np.float64)
+    return {'values': [int(v) for v in values], 'probabilities': (weights / weights.sum()).tolist()}
+
+
+def default_params(max_contexts=1000, mean_contexts=100, max_path_length=8):
+    contexts = np.arange(1, max_contexts + 1)
+    return {
+        # geometric-like: the probability decays exponentially with the number of contexts
+        'num_contexts': discrete_distribution(contexts, np.exp(-contexts / mean_contexts)),
+        'path_length': discrete_distribution(range(2, max_path_length + 2), [1] * max_path_length),
+        'token_subtokens': discrete_distribution([1, 2, 3, 4, 5], [50, 30, 12, 6, 2]),
+        'target_subtokens': discrete_distribution([1, 2, 3, 4, 5, 6], [25, 40, 20, 10, 4, 1]),
+        'subtoken_vocab': {'size': 190000, 'zipf_exponent': 1.1},
+        'node_vocab': {'size': 300, 'zipf_exponent': 1.0},
+        'target_vocab': {'size': 27000, 'zipf_exponent': 1.1},
+    }
+
+
+def estimate_zipf_exponent(counts, max_ranks=1000):
+    # The slope of the rank-frequency curve on a log-log scale, over the most frequent words
+    frequencies = np.sort(np.array(counts, dtype=np.float64))[::-1][:max_ranks]
+    if len(frequencies) < 2:
+        return 1.0
+    ranks = np.arange(1, len(frequencies) + 1)
+    slope, _ = np.polyfit(np.log(ranks), np.log(frequencies), 1)
+    return float(max(-slope, 0.01))
+
+
+def fit_params(raw_path, max_lines=None):
+    # Fits the parameters of the generator to the first max_lines lines of a raw (extractor output) file
+    num_contexts, path_lengths, token_subtokens, target_subtokens = {}, {}, {}, {}
+    subtoken_to_count, node_to_count, target_to_count = {}, {}, {}
+
+    def add(histogram, key):
+        histogram[key] = histogram.get(key, 0) + 1
+
+    with open(raw_path, 'r') as file:
+        for line_index, line in enumerate(file):
+            if max_lines is not None and line_index >= max_lines:
+                break
+            parts = line.rstrip('\n').split(' ')
+            target_parts = parts[0].split('|')
+            add(target_subtokens, len(target_parts))
+            for target_part in target_parts:
+                add(target_to_count, target_part)
+            contexts = [context for context in parts[1:] if context]
+            add(num_contexts, len(contexts))
+            for context in contexts:
+                source, path, target = context.split(',')
+                nodes = path.split('|')
+                add(path_lengths, len(nodes))
+                for node in nodes:
+                    add(node_to_count, node)
+                for token in [source, target]:
+                    subtokens = token.split('|')
+                    add(token_subtokens, len(subtokens))
+                    for subtoken in subtokens:
+                        add(subtoken_to_count, subtoken)
+
+    def fitted_distribution(histogram):
+        values = sorted(histogram)
+        return discrete_distribution(values, [histogram[v] for v in values])
+
+    def fitted_vocab(word_to_count):
+        return {'size': len(word_to_count), 'zipf_exponent': estimate_zipf_exponent(list(word_to_count.values()))}
+
+    return {
+        'num_contexts': fitted_distribution(num_contexts),
+        'path_length': fitted_distribution(path_lengths),
+        'token_subtokens': fitted_distribution(token_subtokens),
+        'target_subtokens': fitted_distribution(target_subtokens),
+        'subtoken_vocab': fitted_vocab(subtoken_to_count),
+        'node_vocab': fitted_vocab(node_to_count),
+        'target_vocab': fitted_vocab(target_to_count),
+    }
+
+
+def word_for_rank(rank, alphabet='abcdefghijklmnopqrstuvwxyz'):
+    # a distinct lowercase word for every rank: a, b, ..., z, ba, bb, ...
+    word = alphabet[rank % len(alphabet)]
+    rank //= len(alphabet)
+    while rank > 0:
+        word = alphabet[rank % len(alphabet)] + word
+        rank //= len(alphabet)
+    return word
+
+
+class ZipfVocab:
+    # A vocabulary of `size` words, where the probability of the word of rank r is proportional to 1 / r^exponent
+    def __init__(self, size, zipf_exponent, word_prefix=''):
+        self.words = [word_prefix + word_for_rank(rank) for rank in range(size)]
+        probabilities = 1.0 / np.power(np.arange(1, size + 1, dtype=np.float64), zipf_exponent)
+        self.cumulative = np.cumsum(probabilities / probabilities.sum())
+        self.counts = np.zeros(size, dtype=np.int64)
+
+    def sample(self, rng, n, count=False):
+        indices = np.minimum(np.searchsorted(self.cumulative, rng.random_sample(n), side='right'),
+                             len(self.words) - 1)
+        if count:
+            self.counts += np.bincount(indices, minlength=len(self.words))
+        return indices
+
+    def write_histogram(self, path):
+        # in the format of the histograms of preprocess.sh: "word count", only for words that occurred
+        with open(path, 'w') as file:
+            for index in np.nonzero(self.counts)[0]:
+                file.write('%s %d\n' % (self.words[index], self.counts[index]))
+
+
+class SyntheticDatasetGenerator:
+    def __init__(self, params, seed):
+        self.params = params
+        self.rng = np.random.RandomState(seed)
+        self.subtokens = ZipfVocab(**params['subtoken_vocab'])
+        # node names start with an uppercase letter, like the AST node types of the extractors
+        self.nodes = ZipfVocab(word_prefix='N', **params['node_vocab'])
+        self.targets = ZipfVocab(**params['target_vocab'])
+
+    def sample_values(self, distribution, n):
+        return self.rng.choice(distribution['values'], size=n, p=distribution['probabilities'])
+
+    def sample_names(self, vocab, num_parts, count):
+        # Returns a list of '|'-joined names, the i-th of num_parts[i] subtokens
+        words = vocab.words
+        indices = vocab.sample(self.rng, int(num_parts.sum()), count=count)
+        boundaries = np.cumsum(num_parts)[:-1]
+        return ['|'.join([words[i] for i in name]) for name in np.split(indices, boundaries)]
+
+    def write_examples(self, path, num_examples, count_histograms=False):
+        with open(path, 'w') as file:
+            for chunk_start in range(0, num_examples, CHUNK_SIZE):
+                chunk_size = min(CHUNK_SIZE, num_examples - chunk_start)
+                file.write(self.generate_chunk(chunk_size, count_histograms))
+
+    def generate_chunk(self, num_examples, count_histograms):
+        num_contexts = self.sample_values(self.params['num_contexts'], num_examples)
+        total_contexts = int(num_contexts.sum())
+        target_names = self.sample_names(self.targets,
+                                         self.sample_values(self.params['target_subtokens'], num_examples),
+                                         count_histograms)
+        tokens = self.sample_names(self.subtokens,
+                                   self.sample_values(self.params['token_subtokens'], 2 * total_contexts),
+                                   count_histograms)
+        paths = self.sample_names(self.nodes, self.sample_values(self.params['path_length'], total_contexts),
+                                  count_histograms)
+        lines = []
+        context_index = 0
+        for target_name, example_contexts in zip(target_names, num_contexts):
+            contexts = ['%s,%s,%s' % (tokens[2 * i], paths[i], tokens[2 * i + 1])
+                        for i in range(context_index, context_index + example_contexts)]
+            context_index += example_contexts
+            lines.append(target_name + ' ' + ' '.join(contexts) + '\n')
+        return ''.join(lines)
+
+    def write_histograms(self, output_name):
+        self.targets.write_histogram(output_name + '.histo.tgt.c2s')
+        self.subtokens.write_histogram(output_name + '.histo.ori.c2s')
+        self.nodes.write_histogram(output_name + '.histo.node.c2s')
+
+
+def generate_dataset(params, output_name, num_train_examples, num_val_examples, num_test_examples, seed):
+    # The histograms are counted on the training data only, like in preprocess.sh
+    generator = SyntheticDatasetGenerator(params, seed)
+    for role, num_examples in [('test', num_test_examples), ('val', num_val_examples),
+                               ('train', num_train_examples)]:
+        generator.write_examples('{}.{}.raw.txt'.format(output_name, role), num_examples,
+                                 count_histograms=role == 'train')
+        print('Generated %d %s examples' % (num_examples, role))
+    generator.write_histograms(output_name)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser()
+    parser.add_argument("-o", "--output_name", dest="output_name",
+                        help="output name - the base name for the created files", required=True)
+    parser.add_argument("--train_examples", dest="num_train_examples", type=int, default=100000)
+    parser.add_argument("--val_examples", dest="num_val_examples", type=int, default=10000)
+    parser.add_argument("--test_examples", dest="num_test_examples", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=239)
+    parser.add_argument("--fit", dest="fit_path", metavar="FILE",
+                        help="fit the distributions to this raw (extractor output) file")
+    parser.add_argument("--fit_lines", type=int, default=None,
+                        help="fit only to the first lines of the --fit file")
+    parser.add_argument("--params", dest="params_path", metavar="FILE",
+                        help="load the distributions from a JSON file saved with --save_params")
+    parser.add_argument("--save_params", dest="save_params_path", metavar="FILE",
+                        help="save the distributions to a JSON file")
+    parser.add_argument("--max_contexts", type=int, default=1000,
+                        help="the max number of contexts per example, when not fitted")
+    parser.add_argument("--mean_contexts", type=int, default=100,
+                        help="the scale of the number of contexts per example, when not fitted")
+    parser.add_argument("--max_path_length", type=int, default=8,
+                        help="the max path length, when not fitted")
+    parser.add_argument("--subtoken_vocab_size", type=int, help="overrides the subtoken vocabulary size")
+    parser.add_argument("--subtoken_zipf", type=float, help="overrides the subtoken Zipf exponent")
+    parser.add_argument("--target_vocab_size", type=int, help="overrides the target vocabulary size")
+    parser.add_argument("--target_zipf", type=float, help="overrides the target Zipf exponent")
+    parser.add_argument("--node_vocab_size", type=int, help="overrides the node vocabulary size")
+    parser.add_argument("--node_zipf", type=float, help="overrides the node Zipf exponent")
+    args = parser.parse_args()
+
+    if args.params_path:
+        with open(args.params_path, 'r') as file:
+            params = json.load(file)
+    elif args.fit_path:
+        params = fit_params(args.fit_path, max_lines=args.fit_lines)
+    else:
+        params = default_params(max_contexts=args.max_contexts, mean_contexts=args.mean_contexts,
+                                max_path_length=args.max_path_length)
+    for vocab, size, exponent in [('subtoken_vocab', args.subtoken_vocab_size, args.subtoken_zipf),
+                                  ('target_vocab', args.target_vocab_size, args.target_zipf),
+                                  ('node_vocab', args.node_vocab_size, args.node_zipf)]:
+        if size is not None:
+            params[vocab]['size'] = size
+        if exponent is not None:
+            params[vocab]['zipf_exponent'] = exponent
+    if args.save_params_path:
+        with open(args.save_params_path, 'w') as file:
+            json.dump(params, file, indent=2)
+
+    mean_contexts = np.dot(params['num_contexts']['values'], params['num_contexts']['probabilities'])
+    print('Mean contexts per example: %.1f, vocabularies: %d subtokens, %d nodes, %d targets' % (
+        mean_contexts, params['subtoken_vocab']['size'], params['node_vocab']['size'], params['target_vocab']['size']))
+    generate_dataset(params, args.output_name, args.num_train_examples, args.num_val_examples,
+                     args.num_test_examples, seed=args.seed)
@@ -0,0 +1,95 @@
+import collections
+import contextlib
+import json
+import numbers
+import os
+import threading
+import time
+
+import tensorflow as tf
+
+
+class Telemetry:
+    # Records measurements of training and evaluation to two files:
+    # <path>.jsonl - one JSON record per logging window or event, and
+    # <path>.prom - a Prometheus textfile (for the node exporter's textfile collector) with the latest value of
+    # every numeric field, as a gauge named code2seq_<event>_<field>.
+    # A window accumulates named durations (add_time / timer) until end_window() records them.
+    metric_prefix = 'code2seq'
+
+    def __init__(self, path):
+        self.jsonl_path = path + '.jsonl'
+        self.prometheus_path = path + '.prom'
+        dirname = os.path.dirname(self.jsonl_path)
+        if dirname and not os.path.exists(dirname):
+            os.makedirs(dirname)
+        self.window_times = collections.defaultdict(lambda: collections.defaultdict(float))
+        self.window_start_times = collections.defaultdict(time.time)
+        self.latest_values = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def start_window(self, window):
+        self.window_times[window].clear()
+        self.window_start_times[window] = time.time()
+
+    def add_time(self, window, name, seconds):
+        with self.lock:
+            self.window_times[window][name] += seconds
+
+    @contextlib.contextmanager
+    def timer(self, window, name):
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.add_time(window, name, time.time() - start_time)
+
+    def end_window(self, window, **values):
+        # Records the durations accumulated in the window (as <name>_seconds, and <name>_fraction of the window),
+        # the total duration of the window, and the given values. The next window starts now.
+        with self.lock:
+            window_seconds = time.time() - self.window_start_times[window]
+            record = {'window_seconds': window_seconds}
+            for name, seconds in self.window_times[window].items():
+                record[name + '_seconds'] = seconds
+                record[name + '_fraction'] = seconds / window_seconds if window_seconds > 0 else 0
+        self.start_window(window)
+        record.update(values)
+        if 'examples' in values and window_seconds > 0:
+            record['examples_per_second'] = values['examples'] / window_seconds
+        self.record(window, **record)
+
+    def record(self, event, **values):
+        values = {name: self.to_builtin(value) for name, value in values.items() if value is not None}
+        with self.lock:
+            with open(self.jsonl_path, 'a') as file:
+                file.write(json.dumps(dict(time=time.time(), event=event, **values), sort_keys=True) + '\n')
+            for name, value in sorted(values.items()):
+                if isinstance(value, numbers.Number) and not isinstance(value, bool):
+                    self.latest_values['%s_%s_%s' % (self.metric_prefix, event, name)] = value
+            self.write_prometheus_textfile()
+
+    def write_prometheus_textfile(self):
+        # written to a temporary file and renamed, so that the collector never reads a partially written file
+        temp_path = self.prometheus_path + '.tmp'
+        with open(temp_path, 'w') as file:
+            for name, value in self.latest_values.items():
+                file.write('# TYPE %s gauge\n%s %s\n' % (name, name, repr(float(value))))
+        os.replace(temp_path, self.prometheus_path)
+
+    @staticmethod
+    def to_builtin(value):
+        # numpy scalars are not JSON serializable
+        if hasattr(value, 'item'):
+            return value.item()
+        return value
+
+
+def parse_buffer_utilization(serialized_summary):
+    # Returns the (sum, count) of the prefetch buffer utilization histogram in a tf.data StatsAggregator summary
+    # (both are cumulative since the aggregator was created), or None if it was not recorded yet
+    summary = tf.Summary.FromString(serialized_summary)
+    for value in summary.value:
+        if value.tag.endswith('buffer_utilization') and value.HasField('histo'):
+            return value.histo.sum, value.histo.num
+    return None
@@ -0,0 +1,26 @@
+import unittest
+
+from benchmarks import run_benchmarks
+
+BENCHMARK_NAMES = {
+    'preprocess_mb_per_sec', 'reader_train_examples_per_sec', 'reader_eval_examples_per_sec', 'train_steps_per_sec',
+    'eval_greedy_examples_per_sec', 'eval_beam_examples_per_sec', 'predict_single_latency_ms',
+    'predict_batch_latency_per_example_ms'}
+
+
+class TestBenchmarks(unittest.TestCase):
+    def test_smoke_run(self):
+        # The whole suite on a tiny dataset: every benchmark must run and report a result
+        args = run_benchmarks.parse_args(['--repeats', '1', '--num_train_examples', '30', '--num_eval_examples', '10',
+                                          '--max_data_contexts', '10', '--train_steps', '2', '--beam_width', '2',
+                                          '--predict_batch_size', '3'])
+        results = run_benchmarks.run_benchmarks(args)
+
+        self.assertEqual(set(results['benchmarks']), BENCHMARK_NAMES)
+        for name, result in results['benchmarks'].items():
+            self.assertGreater(result['value'], 0, name)
+        self.assertEqual(run_benchmarks.compare_to_baseline(results, results, tolerance=0.1), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
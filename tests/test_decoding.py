@@ -0,0 +1,116 @@
+import os
+import pickle
+import shutil
+import tempfile
+import unittest
+from argparse import Namespace
+
+import numpy as np
+import tensorflow as tf
+
+from common import Common
+from config import Config
+from model import Model
+
+BATCH_SIZE = 32
+CONTEXT_SIZE = 13
+
+
+def prediction_lengths(sample_ids, end_token):
+    # The length of every predicted sequence, including its first end token
+    lengths = []
+    for row in sample_ids:
+        end_positions = np.flatnonzero(row == end_token)
+        lengths.append(end_positions[0] + 1 if len(end_positions) > 0 else len(row))
+    return lengths
+
+
+class TestEarlyExitDecoding(unittest.TestCase):
+    # The early-exit greedy decoder (EARLY_EXIT_DECODING) must use the variables of the AttentionWrapper decoder,
+    # and predict the same sequences on a small random model
+
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='code2seq_test_')
+        data_path = os.path.join(self.work_dir, 'data')
+        with open(data_path + '.dict.c2s', 'wb') as file:
+            pickle.dump({'subtoken%d' % i: 10 - i for i in range(5)}, file)
+            pickle.dump({'node%d' % i: 10 - i for i in range(5)}, file)
+            # a small target vocabulary, so that the random model predicts PAD (the end token) at various steps
+            pickle.dump({'target%d' % i: 10 - i for i in range(4)}, file)
+            pickle.dump(5, file)
+            pickle.dump(100, file)
+        args = Namespace(data_path=data_path, test_path=None, save_path_prefix=None, load_path=None, release=False,
+                         num_eval_workers=1, ps_hosts=None, worker_hosts=None, task_index=0, telemetry_path=None,
+                         profile_path=None)
+        self.config = Config.get_debug_config(args)
+        self.model = Model(self.config)
+        self.end_token = self.model.target_to_index[Common.PAD]
+
+    def tearDown(self):
+        self.model.close_session()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def build_decoder(self, contexts, early_exit, reuse):
+        # Returns the predicted ids (batch, time) and the attention weights (time, batch, max_contexts)
+        self.config.EARLY_EXIT_DECODING = early_exit
+        with tf.variable_scope('model', reuse=reuse):
+            target_words_vocab = tf.get_variable('TARGET_WORDS_VOCAB',
+                                                 shape=(self.model.target_vocab_size, self.config.EMBEDDINGS_SIZE),
+                                                 dtype=tf.float32, trainable=False)
+            outputs, final_states = self.model.decode_outputs(target_words_vocab=target_words_vocab,
+                                                              target_input=None, batch_size=tf.shape(contexts)[0],
+                                                              batched_contexts=contexts,
+                                                              valid_mask=tf.ones_like(contexts[:, :, 0]),
+                                                              is_evaluating=True)
+        return outputs.sample_id, final_states.alignment_history.stack()
+
+    def test_same_variables(self):
+        # The decoder that is built second reuses the variables of the first one (reuse=True fails on a variable
+        # that does not exist), and must not create any. Building them in both orders checks that both use the
+        # same variables, with the same names and shapes
+        for early_exit_first in [False, True]:
+            with self.subTest(early_exit_first=early_exit_first), tf.Graph().as_default():
+                contexts = tf.placeholder(tf.float32, shape=(None, self.config.MAX_CONTEXTS, CONTEXT_SIZE))
+                self.build_decoder(contexts, early_exit=early_exit_first, reuse=None)
+                variables = [(variable.name, variable.shape.as_list()) for variable in tf.global_variables()]
+                self.build_decoder(contexts, early_exit=not early_exit_first, reuse=True)
+                self.assertEqual([(variable.name, variable.shape.as_list()) for variable in tf.global_variables()],
+                                 variables)
+
+    def test_same_predictions(self):
+        batch_contexts = np.random.RandomState(239).normal(
+            size=(BATCH_SIZE, self.config.MAX_CONTEXTS, CONTEXT_SIZE)).astype(np.float32)
+        for early_exit in [False, True]:
+            with self.subTest(early_exit=early_exit), tf.Graph().as_default():
+                tf.set_random_seed(239)
+                contexts = tf.placeholder(tf.float32, shape=(None, self.config.MAX_CONTEXTS, CONTEXT_SIZE))
+                expected_ids_op, expected_alignments_op = self.build_decoder(contexts, early_exit=False, reuse=None)
+                ids_op, alignments_op = self.build_decoder(contexts, early_exit=early_exit, reuse=True)
+                with tf.Session() as sess:
+                    sess.run(tf.global_variables_initializer())
+                    expected_ids, expected_alignments, ids, alignments = sess.run(
+                        [expected_ids_op, expected_alignments_op, ids_op, alignments_op],
+                        feed_dict={contexts: batch_contexts})
+                    single_example_ids = [sess.run(ids_op, feed_dict={contexts: batch_contexts[i:i + 1]})[0]
+                                          for i in range(BATCH_SIZE)]
+
+                # dynamic_decode keeps decoding the examples that finished, their later steps are not compared
+                self.assertEqual(ids.shape, expected_ids.shape)
+                lengths = prediction_lengths(expected_ids, self.end_token)
+                self.assertEqual(prediction_lengths(ids, self.end_token), lengths)
+                for i, length in enumerate(lengths):
+                    np.testing.assert_array_equal(ids[i, :length], expected_ids[i, :length])
+                    np.testing.assert_allclose(alignments[:length, i], expected_alignments[:length, i],
+                                               rtol=1e-5, atol=1e-6)
+
+                # the prediction of an example does not depend on the other examples of the batch
+                for i, example_ids in enumerate(single_example_ids):
+                    np.testing.assert_array_equal(example_ids[:lengths[i]], ids[i, :lengths[i]])
+                    if early_exit:
+                        # the finished examples emit PAD until the whole batch finished
+                        self.assertTrue(np.all(ids[i, lengths[i]:] == self.end_token))
+                        self.assertTrue(np.all(example_ids[lengths[i]:] == self.end_token))
+
+
+if __name__ == '__main__':
+    unittest.main()
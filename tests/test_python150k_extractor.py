@@ -0,0 +1,83 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+EXTRACT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                            'Python150kExtractor', 'extract.py')
+SPLIT_NAMES = ['train', 'valid', 'test']
+
+
+def function_ast(name, parameter, variable, number):
+    # The AST (in the format of the Python150k dataset) of:
+    # def name(parameter):
+    #     variable = parameter + number
+    return [
+        {'type': 'Module', 'children': [1]},
+        {'type': 'FunctionDef', 'value': name, 'children': [2, 4]},
+        {'type': 'arguments', 'children': [3]},
+        {'type': 'NameParam', 'value': parameter},
+        {'type': 'body', 'children': [5]},
+        {'type': 'Assign', 'children': [6, 7]},
+        {'type': 'NameStore', 'value': variable},
+        {'type': 'BinOpAdd', 'children': [8, 9]},
+        {'type': 'NameLoad', 'value': parameter},
+        {'type': 'Num', 'value': str(number)},
+    ]
+
+
+def write_json_file(path, asts):
+    with open(path, 'w', encoding='utf-8') as file:
+        for ast in asts:
+            file.write(json.dumps(ast) + '\n')
+
+
+class TestStreamingExtraction(unittest.TestCase):
+    def setUp(self):
+        self.work_dir = tempfile.mkdtemp(prefix='code2seq_test_')
+        self.data_dir = os.path.join(self.work_dir, 'data')
+        os.makedirs(self.data_dir)
+        train_asts = [function_ast('getValue%d' % i, 'self', 'result_%d' % i, i) for i in range(12)]
+        # a module without functions has no samples
+        train_asts.insert(5, [{'type': 'Module', 'children': [1]}, {'type': 'NameLoad', 'value': 'x'}])
+        write_json_file(os.path.join(self.data_dir, 'python100k_train.json'), train_asts)
+        write_json_file(os.path.join(self.data_dir, 'python50k_eval.json'),
+                        [function_ast('setName%d' % i, 'name', 'nameLength', i) for i in range(7)])
+
+    def tearDown(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def extract(self, output_name, extra_args):
+        # Returns the content of the output file of every split
+        output_dir = os.path.join(self.work_dir, output_name)
+        subprocess.run([sys.executable, EXTRACT_PATH, '--data_dir', self.data_dir, '--output_dir', output_dir,
+                        '--n_jobs', '1', '--valid_p', '0.25'] + extra_args,
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        outputs = {}
+        for split_name in SPLIT_NAMES:
+            with open(os.path.join(output_dir, '%s_output_file.txt' % split_name), 'rb') as file:
+                outputs[split_name] = file.read()
+        self.assertEqual(sorted(os.listdir(output_dir)),
+                         sorted('%s_output_file.txt' % split_name for split_name in SPLIT_NAMES))
+        return outputs
+
+    def test_same_output_as_default_mode(self):
+        expected = self.extract('default', [])
+        # several shards, to check their concatenation
+        outputs = self.extract('streaming', ['--streaming', '--lines_per_shard', '5'])
+
+        self.assertEqual(outputs['test'], expected['test'])
+        self.assertEqual(expected['test'].count(b'\n'), 6)
+        for split_name in SPLIT_NAMES:
+            self.assertFalse(outputs[split_name].endswith(b'\n'), split_name)
+        # train and valid are split differently (by a hash of the line number in the streaming mode),
+        # but have the same samples together
+        self.assertEqual(sorted(outputs['train'].splitlines() + outputs['valid'].splitlines()),
+                         sorted(expected['train'].splitlines() + expected['valid'].splitlines()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+###########################################################
+# Data-parallel training on a single machine: one parameter server and num_workers worker processes,
+# communicating over localhost. Each worker trains on a disjoint shard of the training data,
+# and worker 0 evaluates and saves the model, as in train.sh.
+# To train across several machines, run the same commands on each machine with the real host names in
+# ps_hosts and worker_hosts (one --job_name/--task_index per process).
+# Change the following values to train a new model.
+# type: the name of the new model, only affects the saved file name.
+# dataset: the name of the dataset, as was preprocessed using preprocess.sh
+# test_data: by default, points to the validation set, since this is the set that
+#   will be evaluated after each training iteration. If you wish to test
+#   on the final (held-out) test set, change 'val' to 'test'.
+type=java-large-model
+dataset_name=java-large
+data_dir=data/java-large
+data=${data_dir}/${dataset_name}
+test_data=${data_dir}/${dataset_name}.val.c2s
+model_dir=models/${type}
+num_workers=4
+first_port=2222
+
+ps_hosts=localhost:${first_port}
+worker_hosts=$(seq -s, -f "localhost:%g" $((first_port + 1)) $((first_port + num_workers)))
+
+mkdir -p ${model_dir}
+set -e
+python3 -u code2seq.py --ps_hosts ${ps_hosts} --worker_hosts ${worker_hosts} --job_name ps --task_index 0 &
+ps_pid=$!
+trap "kill ${ps_pid}" EXIT
+
+worker_pids=()
+for ((i = 1; i < num_workers; i++)); do
+  python3 -u code2seq.py --data ${data} --ps_hosts ${ps_hosts} --worker_hosts ${worker_hosts} \
+    --job_name worker --task_index ${i} > ${model_dir}/worker${i}.log 2>&1 &
+  worker_pids+=($!)
+done
+python3 -u code2seq.py --data ${data} --test ${test_data} --save_prefix ${model_dir}/model \
+  --ps_hosts ${ps_hosts} --worker_hosts ${worker_hosts} --job_name worker --task_index 0
+wait "${worker_pids[@]}"